@@ -0,0 +1,47 @@
+"""Add client and PSSR rollup tables
+
+Revision ID: a3f9c2e6d8b1
+Revises: f1b6d2e7a9c4
+Create Date: 2026-10-19 16:37:12.408915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f9c2e6d8b1'
+down_revision: Union[str, None] = 'f1b6d2e7a9c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNT_COLUMNS = ['machines', 'critical', 'maintenance', 'operational', 'pending_high', 'pending_medium', 'pending_low']
+
+
+def upgrade() -> None:
+    # Filled by the app (services.rollups): at the next startup, ingestion or generation
+    op.create_table('client_rollups',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('pssr', sa.String(), nullable=True),
+    *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNT_COLUMNS],
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('client_id')
+    )
+    op.create_index(op.f('ix_client_rollups_pssr'), 'client_rollups', ['pssr'], unique=False)
+    op.create_table('pssr_rollups',
+    sa.Column('pssr', sa.String(), nullable=False),
+    sa.Column('clients', sa.Integer(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNT_COLUMNS],
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('pssr')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pssr_rollups')
+    op.drop_index(op.f('ix_client_rollups_pssr'), table_name='client_rollups')
+    op.drop_table('client_rollups')
@@ -0,0 +1,32 @@
+"""Add data_version table
+
+Revision ID: a7c3e91f2b10
+Revises: 1348bcf1ed4b
+Create Date: 2026-10-19 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e91f2b10'
+down_revision: Union[str, None] = '1348bcf1ed4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_version (id, version, updated_at) VALUES (1, 0, now())")
+
+
+def downgrade() -> None:
+    op.drop_table('data_version')
@@ -0,0 +1,43 @@
+"""Add data_version stamps and deleted_rows tombstones
+
+Revision ID: b2d84f0c6e31
+Revises: a7c3e91f2b10
+Create Date: 2026-10-19 10:03:17.884102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d84f0c6e31'
+down_revision: Union[str, None] = 'a7c3e91f2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('machines', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_machines_data_version'), 'machines', ['data_version'], unique=False)
+    op.add_column('interventions', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_interventions_data_version'), 'interventions', ['data_version'], unique=False)
+
+    op.create_table('deleted_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deleted_rows_data_version'), 'deleted_rows', ['data_version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deleted_rows_data_version'), table_name='deleted_rows')
+    op.drop_table('deleted_rows')
+    op.drop_index(op.f('ix_interventions_data_version'), table_name='interventions')
+    op.drop_column('interventions', 'data_version')
+    op.drop_index(op.f('ix_machines_data_version'), table_name='machines')
+    op.drop_column('machines', 'data_version')
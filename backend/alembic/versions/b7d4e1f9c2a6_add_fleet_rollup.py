@@ -0,0 +1,35 @@
+"""Add fleet rollup table
+
+Revision ID: b7d4e1f9c2a6
+Revises: a3f9c2e6d8b1
+Create Date: 2026-10-19 18:21:40.517302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e1f9c2a6'
+down_revision: Union[str, None] = 'a3f9c2e6d8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNT_COLUMNS = ['machines', 'critical', 'maintenance', 'operational', 'pending_high', 'pending_medium', 'pending_low']
+
+
+def upgrade() -> None:
+    # Filled by the app (services.rollups): the stored rollups' version is now read from this
+    # table, so the next startup recomputes all three
+    op.create_table('fleet_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNT_COLUMNS],
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fleet_rollups')
@@ -0,0 +1,81 @@
+"""Typed date columns
+
+Revision ID: c5e1a8d3f7b2
+Revises: b2d84f0c6e31
+Create Date: 2026-10-19 11:42:05.310457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1a8d3f7b2'
+down_revision: Union[str, None] = 'b2d84f0c6e31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, column, indexed)
+DATE_COLUMNS = [
+    ('machines', 'last_visit', True),
+    ('machines', 'next_visit', True),
+    ('cvaf', 'start_date', False),
+    ('cvaf', 'end_date', True),
+    ('suivi_ps', 'date', False),
+    ('suivi_ps', 'deadline', True),
+    ('inspection_rate', 'date_facture', False),
+    ('inspection_rate', 'last_inspect', True),
+]
+
+
+def _date_using(column: str) -> str:
+    # Ingestion wrote str(pd.Timestamp) ('2024-01-15 00:00:00'); Excel serials and DD/MM/YYYY
+    # text are accepted too. Anything else becomes NULL instead of failing the migration.
+    column = f'"{column}"'
+    return (
+        f"CASE "
+        f"WHEN {column} ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}' THEN substring({column} from 1 for 10)::date "
+        f"WHEN {column} ~ '^\\d{{1,2}}/\\d{{1,2}}/\\d{{4}}$' THEN to_date({column}, 'DD/MM/YYYY') "
+        f"WHEN {column} ~ '^\\d+(\\.\\d+)?$' THEN DATE '1899-12-30' + floor({column}::numeric)::int "
+        f"END"
+    )
+
+
+def upgrade() -> None:
+    for table, column, indexed in DATE_COLUMNS:
+        op.alter_column(table, column,
+               existing_type=sa.VARCHAR(),
+               type_=sa.Date(),
+               existing_nullable=True,
+               postgresql_using=_date_using(column))
+        if indexed:
+            op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False)
+
+    op.alter_column('machines', 'last_reported_time',
+               existing_type=sa.Float(),
+               type_=sa.DateTime(),
+               existing_nullable=True,
+               postgresql_using="CASE WHEN last_reported_time = 'NaN' THEN NULL "
+                                "ELSE TIMESTAMP '1899-12-30' + last_reported_time * INTERVAL '1 day' END")
+    op.create_index(op.f('ix_machines_last_reported_time'), 'machines', ['last_reported_time'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_machines_last_reported_time'), table_name='machines')
+    op.alter_column('machines', 'last_reported_time',
+               existing_type=sa.DateTime(),
+               type_=sa.Float(),
+               existing_nullable=True,
+               postgresql_using="EXTRACT(EPOCH FROM last_reported_time - TIMESTAMP '1899-12-30') / 86400")
+
+    for table, column, indexed in reversed(DATE_COLUMNS):
+        if indexed:
+            op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
+        op.alter_column(table, column,
+               existing_type=sa.Date(),
+               type_=sa.VARCHAR(),
+               existing_nullable=True,
+               postgresql_using=f"to_char(\"{column}\", 'YYYY-MM-DD HH24:MI:SS')")
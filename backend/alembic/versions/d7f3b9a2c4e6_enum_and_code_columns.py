@@ -0,0 +1,128 @@
+"""Enum and small-int code columns
+
+Revision ID: d7f3b9a2c4e6
+Revises: c5e1a8d3f7b2
+Create Date: 2026-10-19 13:08:51.624019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f3b9a2c4e6'
+down_revision: Union[str, None] = 'c5e1a8d3f7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ENUMS = {
+    'type': postgresql.ENUM('CVAF', 'INSPECTION', 'SUIVI_PS', 'OPPORTUNITY', name='intervention_type'),
+    'priority': postgresql.ENUM('HIGH', 'MEDIUM', 'LOW', name='intervention_priority'),
+    'status': postgresql.ENUM('PENDING', 'PLANNED', 'COMPLETED', 'CANCELLED', name='intervention_status'),
+}
+
+# Copy of services.status_codes.score_code at this revision, for the backfill. Computed in Python:
+# str.strip() drops every Unicode whitespace (tabs, newlines, NBSP...), which SQL trim() does not.
+def _score_code(val) -> int:
+    if val is None:
+        return 0
+    s_val = str(val).strip().lower()
+    if s_val == '0/1':
+        return 3
+    if s_val in ['0', '1', '0.0', '1.0']:
+        return 2
+    if '/' in s_val:
+        parts = [p.strip() for p in s_val.split('/')]
+        if parts[0] == '0' and len(parts) > 1 and parts[1] != '0':
+            return 2
+    return 1
+
+
+def _backfill_score_codes(bind, score_column, code_column) -> None:
+    # Few distinct raw scores: one UPDATE per value; NULLs keep the server default (0, unknown)
+    values = bind.execute(sa.text(
+        f"SELECT DISTINCT {score_column} FROM cvaf WHERE {score_column} IS NOT NULL"
+    )).scalars().all()
+    if values:
+        bind.execute(
+            sa.text(f"UPDATE cvaf SET {code_column} = :code WHERE {score_column} = :raw"),
+            [{"code": _score_code(raw), "raw": raw} for raw in values],
+        )
+
+
+def upgrade() -> None:
+    # Interventions: native enums, composite indexes matching the filters
+    bind = op.get_bind()
+    for column, enum in ENUMS.items():
+        enum.create(bind, checkfirst=True)
+        op.alter_column('interventions', column,
+               existing_type=sa.VARCHAR(),
+               type_=enum,
+               existing_nullable=True,
+               postgresql_using=f'{column}::{enum.name}')
+
+    op.drop_index('ix_interventions_type', table_name='interventions')
+    op.drop_index('ix_interventions_priority', table_name='interventions')
+    op.drop_index('ix_interventions_status', table_name='interventions')
+    op.drop_index('ix_interventions_machine_id', table_name='interventions')
+    op.create_index('ix_interventions_status_priority', 'interventions', ['status', 'priority'], unique=False)
+    op.create_index('ix_interventions_machine_id_status', 'interventions', ['machine_id', 'status'], unique=False)
+
+    # Machines / CVAF: codes next to the raw strings
+    op.add_column('machines', sa.Column('status_code', sa.SmallInteger(), server_default='0', nullable=False))
+    op.add_column('machines', sa.Column('psi_code', sa.SmallInteger(), server_default='0', nullable=False))
+    op.add_column('cvaf', sa.Column('inspection_code', sa.SmallInteger(), server_default='0', nullable=False))
+    op.add_column('cvaf', sa.Column('sos_code', sa.SmallInteger(), server_default='0', nullable=False))
+
+    op.execute("""
+        UPDATE machines SET
+            status_code = CASE WHEN lower(coalesce(status, '')) ~ '(défaut|urgent|critique|critical|breakdown)' THEN 1 ELSE 0 END,
+            psi_code = CASE WHEN psi_status IS NULL THEN 0 WHEN psi_status = 'Non Inspecté' THEN 2 ELSE 1 END
+    """)
+    _backfill_score_codes(bind, 'inspection_score', 'inspection_code')
+    _backfill_score_codes(bind, 'sos_score', 'sos_code')
+
+    status_codes = op.create_table('status_codes',
+    sa.Column('domain', sa.String(), nullable=False),
+    sa.Column('code', sa.SmallInteger(), nullable=False),
+    sa.Column('label', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('domain', 'code')
+    )
+    op.bulk_insert(status_codes, [
+        {'domain': 'machine_status', 'code': 0, 'label': 'OK'},
+        {'domain': 'machine_status', 'code': 1, 'label': 'URGENT'},
+        {'domain': 'psi_status', 'code': 0, 'label': 'UNKNOWN'},
+        {'domain': 'psi_status', 'code': 1, 'label': 'INSPECTED'},
+        {'domain': 'psi_status', 'code': 2, 'label': 'NOT_INSPECTED'},
+        {'domain': 'cva_score', 'code': 0, 'label': 'UNKNOWN'},
+        {'domain': 'cva_score', 'code': 1, 'label': 'OK'},
+        {'domain': 'cva_score', 'code': 2, 'label': 'LOW'},
+        {'domain': 'cva_score', 'code': 3, 'label': 'MISSING'},
+    ])
+
+
+def downgrade() -> None:
+    op.drop_table('status_codes')
+    op.drop_column('cvaf', 'sos_code')
+    op.drop_column('cvaf', 'inspection_code')
+    op.drop_column('machines', 'psi_code')
+    op.drop_column('machines', 'status_code')
+
+    op.drop_index('ix_interventions_machine_id_status', table_name='interventions')
+    op.drop_index('ix_interventions_status_priority', table_name='interventions')
+    bind = op.get_bind()
+    for column, enum in ENUMS.items():
+        op.alter_column('interventions', column,
+               existing_type=enum,
+               type_=sa.VARCHAR(),
+               existing_nullable=True,
+               postgresql_using=f'{column}::text')
+        enum.drop(bind, checkfirst=True)
+    op.create_index(op.f('ix_interventions_machine_id'), 'interventions', ['machine_id'], unique=False)
+    op.create_index(op.f('ix_interventions_status'), 'interventions', ['status'], unique=False)
+    op.create_index(op.f('ix_interventions_priority'), 'interventions', ['priority'], unique=False)
+    op.create_index(op.f('ix_interventions_type'), 'interventions', ['type'], unique=False)
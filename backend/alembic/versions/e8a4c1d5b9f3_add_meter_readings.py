@@ -0,0 +1,59 @@
+"""Add partitioned meter_readings history
+
+Revision ID: e8a4c1d5b9f3
+Revises: d7f3b9a2c4e6
+Create Date: 2026-10-19 14:21:37.902266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a4c1d5b9f3'
+down_revision: Union[str, None] = 'd7f3b9a2c4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Monthly partitions are created by ingestion (services.meter_history.ensure_partitions);
+    # indexes declared on the parent are cascaded to each of them.
+    op.create_table('meter_readings',
+    sa.Column('machine_id', sa.Integer(), nullable=False),
+    sa.Column('reading_time', sa.DateTime(), nullable=False),
+    sa.Column('service_meter', sa.Float(), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('machine_id', 'reading_time'),
+    postgresql_partition_by='RANGE (reading_time)'
+    )
+    op.create_index('ix_meter_readings_reading_time_brin', 'meter_readings', ['reading_time'], unique=False, postgresql_using='brin')
+
+    # Seed the history with the current meter of every machine
+    op.execute("""
+        DO $$
+        DECLARE m timestamp;
+        BEGIN
+            FOR m IN SELECT DISTINCT date_trunc('month', last_reported_time) FROM machines
+                     WHERE last_reported_time IS NOT NULL AND service_meter IS NOT NULL LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF meter_readings FOR VALUES FROM (%L) TO (%L)',
+                    'meter_readings_' || to_char(m, 'YYYY_MM'), m, m + INTERVAL '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("""
+        INSERT INTO meter_readings (machine_id, reading_time, service_meter, data_version)
+        SELECT id, last_reported_time, service_meter, data_version
+        FROM machines WHERE last_reported_time IS NOT NULL AND service_meter IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    # Dropping the parent drops every partition
+    op.drop_index('ix_meter_readings_reading_time_brin', table_name='meter_readings')
+    op.drop_table('meter_readings')
@@ -0,0 +1,28 @@
+"""Add SERVICE intervention type
+
+Revision ID: f1b6d2e7a9c4
+Revises: e8a4c1d5b9f3
+Create Date: 2026-10-19 15:02:44.187530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6d2e7a9c4'
+down_revision: Union[str, None] = 'e8a4c1d5b9f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A new enum value can't be used in the transaction that adds it
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE intervention_type ADD VALUE IF NOT EXISTS 'SERVICE'")
+
+
+def downgrade() -> None:
+    # PostgreSQL can't drop an enum value; remove its rows and leave the label unused
+    op.execute("DELETE FROM interventions WHERE type = 'SERVICE'")
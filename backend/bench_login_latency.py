@@ -0,0 +1,81 @@
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# Measures GET /machines latency with and without a concurrent login burst.
+# Run it against a server on the old and the new commit to compare:
+#   python bench_login_latency.py --url http://localhost:8000 --password admin123
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def probe_machines(client, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/machines/", params={"limit": 50})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def login_loop(client, stop, email, password, counter):
+    while not stop.is_set():
+        response = await client.post("/auth/token", data={"username": email, "password": password})
+        response.raise_for_status()
+        counter[0] += 1
+
+
+async def run_phase(args, logins):
+    latencies, login_count = [], [0]
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.probes + logins + 5)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60.0, limits=limits) as client:
+        tasks = [asyncio.create_task(probe_machines(client, stop, latencies)) for _ in range(args.probes)]
+        tasks += [
+            asyncio.create_task(login_loop(client, stop, args.email, args.password, login_count))
+            for _ in range(logins)
+        ]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, login_count[0]
+
+
+def report(label, latencies, login_count, duration):
+    ms = [l * 1000 for l in latencies]
+    print(
+        f"{label:<26} n={len(ms):<5} p50={statistics.median(ms):7.1f}ms "
+        f"p95={percentile(ms, 95):7.1f}ms p99={percentile(ms, 99):7.1f}ms max={max(ms):7.1f}ms "
+        f"logins/s={login_count / duration:5.1f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="GET /machines latency during concurrent logins")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="admin@neemba.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=20, help="concurrent login loops")
+    parser.add_argument("--probes", type=int, default=4, help="concurrent /machines loops")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per phase")
+    args = parser.parse_args()
+
+    # Warm the response cache so the probe measures event-loop availability, not SQL
+    async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+        (await client.get("/machines/", params={"limit": 50})).raise_for_status()
+
+    latencies, logins = await run_phase(args, 0)
+    report("/machines, idle", latencies, logins, args.duration)
+    latencies, logins = await run_phase(args, args.logins)
+    report(f"/machines, {args.logins} login loops", latencies, logins, args.duration)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
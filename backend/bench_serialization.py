@@ -0,0 +1,115 @@
+
+import datetime
+import json
+import random
+import time
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from routers.machines import (
+    MachineDTO, LocationDTO, calculate_machine_status_and_interventions, machine_to_dict
+)
+from routers.interventions import InterventionResponse
+from services.cache import render_json
+from services.status_codes import machine_status_code, psi_code, score_code
+
+N_MACHINES = 1000
+N_INTERVENTIONS = 5000
+ROUNDS = 5
+
+
+def fake_machine(i):
+    """Machine-like object with the relationships the status logic walks."""
+    now = datetime.datetime.utcnow()
+    client = SimpleNamespace(name=f"Client {i % 40}")
+    interventions = [
+        SimpleNamespace(
+            id=i * 10 + k, type=random.choice(['CVAF', 'INSPECTION', 'SUIVI_PS']),
+            priority=random.choice(['HIGH', 'MEDIUM', 'LOW']), status='PENDING',
+            description="Action requise : Inspection manquante", date_created=now
+        ) for k in range(random.randint(0, 3))
+    ]
+    suivi_ps = [
+        SimpleNamespace(ps_type="Priority", description="Replace hose", reference_number=f"PI{i}{k}", date=datetime.date(2025, 1, 6))
+        for k in range(random.randint(0, 4))
+    ]
+    sos_score = random.choice(['0/1', '1/1', None])
+    cvaf = SimpleNamespace(
+        cva_type="Premier", sos_score=sos_score, inspection_score='1/1',
+        sos_code=score_code(sos_score), inspection_code=score_code('1/1')
+    ) if i % 2 else None
+    remote = SimpleNamespace(flash_update=random.choice(['0', '1'])) if i % 3 == 0 else None
+    status = random.choice([None, "Actif", "En défaut"])
+    psi_status = random.choice([None, 'Non Inspecté'])
+    return SimpleNamespace(
+        id=i, serial_number=f"SN{i:06d}", model="320D", status=status, status_code=machine_status_code(status),
+        latitude=14.7, longitude=-17.4, last_reported_time=now, psi_status=psi_status, psi_code=psi_code(psi_status),
+        client=client, interventions=interventions, suivi_ps=suivi_ps, cvaf=cvaf, remote_service=remote,
+    )
+
+
+def fastapi_response_model_path(field, content):
+    """What FastAPI does with a response_model: validate, serialize, then JSONResponse.render."""
+    import asyncio
+    value = asyncio.run(serialize_response(field=field, response_content=content))
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def bench(label, fn):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"  {label:<28} best {best * 1000:8.1f} ms   ({len(body) / 1024:.0f} KiB)")
+    return best
+
+
+def bench_machines():
+    machines = [fake_machine(i) for i in range(N_MACHINES)]
+    field = create_model_field(name="Response", type_=List[MachineDTO], mode="serialization")
+
+    def dto_path():
+        response = []
+        for m in machines:
+            status, interventions = calculate_machine_status_and_interventions(m)
+            response.append(MachineDTO(
+                id=m.id, serialNumber=m.serial_number, model=m.model, client=m.client.name,
+                location=LocationDTO(lat=m.latitude, lng=m.longitude, address=m.client.name),
+                status=status, pendingInterventions=interventions
+            ))
+        return fastapi_response_model_path(field, response)
+
+    def fast_path():
+        return render_json([machine_to_dict(m, m.client.name) for m in machines])
+
+    print(f"GET /machines ({N_MACHINES} machines)")
+    slow = bench("DTO + response_model", dto_path)
+    fast = bench("dicts + orjson", fast_path)
+    print(f"  speedup x{slow / fast:.1f}")
+
+
+def bench_interventions():
+    now = datetime.datetime.utcnow()
+    rows = [
+        {"id": i, "machine_id": i % 1000, "type": "CVAF", "priority": "HIGH", "status": "PENDING",
+         "description": "Action requise : Analyse SOS manquante", "date_created": now}
+        for i in range(N_INTERVENTIONS)
+    ]
+    orm_like = [SimpleNamespace(**r) for r in rows]
+    field = create_model_field(name="Response", type_=List[InterventionResponse], mode="serialization")
+
+    print(f"GET /interventions ({N_INTERVENTIONS} rows)")
+    slow = bench("ORM objects + response_model", lambda: fastapi_response_model_path(field, orm_like))
+    fast = bench("row mappings + orjson", lambda: render_json(rows))
+    print(f"  speedup x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    random.seed(42)
+    bench_machines()
+    bench_interventions()
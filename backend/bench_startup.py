@@ -0,0 +1,161 @@
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Cold-start benchmark: how long `import main` takes, and which modules the time goes to.
+#
+# Runs `python -X importtime -c "import main"` in fresh interpreters (no warm module cache in
+# memory, .pyc files as deployed) and aggregates the per-module cumulative import times.
+# --serve also starts uvicorn and measures the time until /health answers (needs a database).
+#
+#   python bench_startup.py --runs 5 --top 15
+#   python bench_startup.py --save startup.json && git checkout other && python bench_startup.py --compare startup.json
+#
+# Modules that should never be imported at startup (see --forbid) fail the run, so a stray
+# module-level `import pandas` shows up in CI.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+# Only needed by ingestion and the offline scripts
+DEFAULT_FORBIDDEN = "pandas,openpyxl,python_calamine"
+
+
+def import_profile() -> dict:
+    """{module: (self_us, cumulative_us, depth)} and the wall time of one `import main`."""
+    start = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, cwd=BACKEND_DIR,
+    )
+    wall = time.perf_counter() - start
+    if child.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{child.stderr[-2000:]}")
+    modules = {}
+    for line in child.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return {"wall_seconds": wall, "modules": modules}
+
+
+def summarize(runs: list, top: int) -> dict:
+    walls = [r["wall_seconds"] for r in runs]
+    names = set().union(*(r["modules"] for r in runs))
+    cumulative = {
+        name: statistics.median(r["modules"][name][1] for r in runs if name in r["modules"]) / 1000
+        for name in names
+    }
+    self_time = {
+        name: statistics.median(r["modules"][name][0] for r in runs if name in r["modules"]) / 1000
+        for name in names
+    }
+    # Time per top-level package (sum of self times), e.g. sqlalchemy, fastapi, numpy
+    packages = {}
+    for name, ms in self_time.items():
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + ms
+    return {
+        "runs": len(runs),
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_main_ms": round(cumulative.get("main", 0.0), 1),
+        "modules_imported": len(names),
+        "top_cumulative_ms": dict(sorted(
+            ((n, round(v, 1)) for n, v in cumulative.items() if n != "main"), key=lambda kv: -kv[1])[:top]),
+        "packages_ms": dict(sorted(((p, round(v, 1)) for p, v in packages.items()), key=lambda kv: -kv[1])[:top]),
+        "modules": sorted(names),
+    }
+
+
+def time_to_health(url: str, timeout: float = 60.0) -> float:
+    import httpx
+
+    port = httpx.URL(url).port or 8000
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"{url}/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.05)
+        raise RuntimeError(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_summary(summary: dict, previous: dict = None):
+    def delta(key):
+        if not previous or key not in previous:
+            return ""
+        return f"  (was {previous[key]:.0f} ms)"
+
+    print(f"import main: {summary['import_main_ms']:.0f} ms{delta('import_main_ms')}, "
+          f"process wall {summary['wall_ms']:.0f} ms{delta('wall_ms')}, "
+          f"{summary['modules_imported']} modules (median of {summary['runs']} runs)")
+    if "health_ms" in summary:
+        print(f"uvicorn start to /health: {summary['health_ms']:.0f} ms{delta('health_ms')}")
+    print("\nSlowest imports (cumulative):")
+    for name, ms in summary["top_cumulative_ms"].items():
+        was = previous.get("top_cumulative_ms", {}).get(name) if previous else None
+        print(f"  {ms:8.1f} ms  {name}" + (f"  (was {was:.1f})" if was is not None else ""))
+    print("\nBy package (self time):")
+    for name, ms in summary["packages_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+    if previous:
+        added = sorted(set(summary["modules"]) - set(previous.get("modules", [])))
+        if added:
+            print(f"\nNewly imported at startup: {', '.join(added[:30])}" + (" ..." if len(added) > 30 else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import/startup time per module")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="comma-separated top-level modules that must not load at startup")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn until /health (needs a database)")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--save", help="write the summary as JSON")
+    parser.add_argument("--compare", help="previous summary JSON")
+    args = parser.parse_args()
+
+    import_profile() # warm the .pyc cache so the first run isn't an outlier
+    summary = summarize([import_profile() for _ in range(args.runs)], args.top)
+    if args.serve:
+        summary["health_ms"] = round(time_to_health(args.url) * 1000, 1)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_summary(summary, previous)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved {args.save}")
+
+    forbidden = {m.strip() for m in args.forbid.split(",") if m.strip()}
+    loaded = sorted(forbidden & {name.split(".")[0] for name in summary["modules"]})
+    if loaded:
+        print(f"\nFAIL: imported at startup: {', '.join(loaded)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
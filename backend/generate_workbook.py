@@ -0,0 +1,223 @@
+
+import argparse
+import datetime
+import os
+import random
+import time
+
+from openpyxl import Workbook
+
+from services.ingestion import LAST_REPORTED_COLUMN
+from services.status_codes import NOT_INSPECTED
+
+# Writes a synthetic Programmes.xlsx with the sheet and column layouts ingest_programmes_data reads:
+# the main machine sheet, CVAF, PSSR_Client, Suivi_PS, Inspection Rate and Remote Service.
+# CVAF, Suivi_PS and Inspection Rate headers come from the column dumps at the repo root
+# (cvaf_columns.txt, columns.txt, inspection_columns.txt); the main sheet layout is the one
+# the ingestion code expects.
+#
+#   python generate_workbook.py --machines 100000 --output bench_data/programmes_100k.xlsx
+#   python generate_workbook.py --machines 10000 --cvaf-ratio 0.8 --ps-per-machine 3 --output /tmp/p.xlsx
+#
+# Rows are streamed (openpyxl write-only mode), so memory stays flat even at 1M machines.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Excel's hard limit, header included
+MAX_SHEET_ROWS = 1048576
+
+MAIN_COLUMNS = [
+    "ID client", "Nom de compte client", "Numéro de compte client", "N° série du matériel", "Marque",
+    "Modèle", "Famille de produits", "Compteur d'entretien (Heures)", LAST_REPORTED_COLUMN,
+    "Dernier statut matériel remonté", "LATITUDE", "LONGITUDE",
+]
+PSSR_COLUMNS = ["Nom du compte", "PSSR/ ISR"]
+REMOTE_COLUMNS = ["Serial Number", "Product Model", "Flash Update"]
+
+MODELS = ["320D", "336", "950H", "D6T", "140M", "C18", "966L", "725C"]
+FAMILIES = ["Excavator", "Wheel Loader", "Dozer", "Grader", "Genset", "Articulated Truck"]
+STATUSES = ["Actif"] * 18 + ["En défaut", "Critique"]
+SCORES = ["1/1", "1/1", "1/1", "0/1", "0/2", None]
+PS_TYPES = ["Priority", "Safety", "Standard", "Product Improvement", "Service Letter"]
+ATELIERS = ["Dakar", "Thiès", "Kaolack", "Saint-Louis"]
+
+
+def read_columns(filename: str) -> list:
+    """
+    Header names from a UTF-16 column dump. inspection_columns.txt was captured through a cp850
+    console, so its accented names are mojibake: re-decode those as UTF-8.
+    """
+    with open(os.path.join(REPO_ROOT, filename), encoding="utf-16") as f:
+        names = [line.strip() for line in f if line.strip()]
+    repaired = []
+    for name in names:
+        try:
+            repaired.append(name.encode("cp850").decode("utf-8"))
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            repaired.append(name)
+    return repaired
+
+
+def serial_for(i: int) -> str:
+    return f"GEN{i:08d}"
+
+
+def write_sheet(wb: Workbook, title: str, columns: list, rows) -> int:
+    ws = wb.create_sheet(title)
+    ws.append(columns)
+    count = 0
+    for row in rows:
+        if isinstance(row, dict):
+            row = [row.get(c) for c in columns]
+        ws.append(row)
+        count += 1
+        if count >= MAX_SHEET_ROWS:
+            raise ValueError(f"Sheet {title} exceeds Excel's {MAX_SHEET_ROWS - 1} data rows; lower the ratios or size")
+    return count
+
+
+def main_rows(rng: random.Random, machines: int, clients: int, now: datetime.datetime):
+    for i in range(1, machines + 1):
+        client = 1 + i % clients
+        located = rng.random() < 0.9
+        yield [
+            client, f"Client {client}", f"ACC{client:06d}", serial_for(i), "CAT",
+            rng.choice(MODELS), rng.choice(FAMILIES), round(rng.uniform(0, 20000), 1),
+            now - datetime.timedelta(minutes=rng.randrange(60 * 24 * 60)),
+            rng.choice(STATUSES),
+            round(rng.uniform(12.5, 16.5), 6) if located else None,
+            round(rng.uniform(-17.5, -11.5), 6) if located else None,
+        ]
+
+
+def cvaf_rows(rng: random.Random, machines: int, ratio: float, today: datetime.datetime):
+    for i in range(1, machines + 1):
+        if rng.random() >= ratio:
+            continue
+        end = today + datetime.timedelta(days=rng.randrange(-60, 365))
+        age = rng.randrange(1, 15)
+        yield {
+            "Serial Number": serial_for(i),
+            "Start Date": end - datetime.timedelta(days=730),
+            "End Date": end,
+            "Cva Type": rng.choice(["Premier", "Preventive Maintenance", "Customer Value Agreement"]),
+            "Country Code": "SN",
+            "Product Vertical": rng.choice(["Construction", "Mining", "Power Systems"]),
+            "Dlr Cust Nm": f"Client {1 + i % 97}",
+            "Current Asset Age": age,
+            "Asset Age Group": "0-5" if age <= 5 else "6-10" if age <= 10 else "10+",
+            "Inspection Score": rng.choice(SCORES),
+            "Connectivity Score": rng.choice(SCORES),
+            "Sos Score": rng.choice(SCORES),
+        }
+
+
+def suivi_ps_rows(rng: random.Random, machines: int, ratio: float, per_machine: int, columns: list,
+                  today: datetime.datetime):
+    filler = [c for c in columns if "%" in c]
+    for i in range(1, machines + 1):
+        if rng.random() >= ratio:
+            continue
+        for _ in range(rng.randint(1, per_machine)):
+            letter = today - datetime.timedelta(days=rng.randrange(30, 900))
+            program = rng.randrange(10000, 99999)
+            row = {
+                "Serial Number": serial_for(i),
+                "MFG Model": rng.choice(MODELS),
+                "Customer": f"Client {1 + i % 97}",
+                "Client": f"Client {1 + i % 97}",
+                "Program Number": f"PS{program}",
+                "Description": f"Replace component {program % 500}",
+                "Status": "Open" if rng.random() < 0.3 else "Closed",
+                "Letter Date": letter,
+                "Term Date": letter + datetime.timedelta(days=rng.randrange(180, 720)),
+                "Service Letter Type": rng.choice(PS_TYPES),
+                "Estimated Open Labor Hours": rng.choice([0.5, 1, 2, 4, 8]),
+            }
+            for c in filler:
+                row[c] = rng.choice((0, 50, 100))
+            yield row
+
+
+def inspection_rows(rng: random.Random, machines: int, ratio: float, columns: list, today: datetime.datetime):
+    # Looked up by the repaired header names the ingestion uses
+    for i in range(1, machines + 1):
+        if rng.random() >= ratio:
+            continue
+        invoiced = today - datetime.timedelta(days=rng.randrange(0, 400))
+        inspected = rng.random() < 0.75
+        values = {
+            "S/N": serial_for(i),
+            "N° OR (Segment)": f"OR{i:08d}-01",
+            "Type matériel": rng.choice(FAMILIES),
+            "Atelier": rng.choice(ATELIERS),
+            "Date Facture (Lignes)": invoiced,
+            "Last Inspect": invoiced if inspected else None,
+            "Nbr": 1,
+            "Nom Client OR (or)": f"Client {1 + i % 97}",
+            "Is Inspected": "Inspecté" if inspected else NOT_INSPECTED,
+            "Technicien Réel": f"Tech {i % 40}",
+            "Equipe Réelle": f"Equipe {i % 6}",
+            "Temps Réel (h)": round(rng.uniform(0.5, 6), 1),
+        }
+        yield [values.get(c) for c in columns]
+
+
+def remote_rows(rng: random.Random, machines: int, ratio: float):
+    for i in range(1, machines + 1):
+        if rng.random() < ratio:
+            yield [serial_for(i), rng.choice(MODELS), "1" if rng.random() < 0.4 else "0"]
+
+
+def generate_workbook(path: str, machines: int, cvaf_ratio: float = 0.5, suivi_ps_ratio: float = 0.5,
+                      ps_per_machine: int = 2, inspection_ratio: float = 0.8, remote_ratio: float = 0.33,
+                      seed: int = 42) -> dict:
+    """Writes the workbook and returns the row count of each sheet."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    today = now.replace(hour=0, minute=0, second=0)
+    clients = max(1, machines // 25)
+    suivi_columns = read_columns("columns.txt")
+    inspection_columns = read_columns("inspection_columns.txt")
+
+    wb = Workbook(write_only=True)
+    counts = {
+        "machines": write_sheet(wb, "Parc", MAIN_COLUMNS, main_rows(rng, machines, clients, now)),
+        "cvaf": write_sheet(wb, "CVAF", read_columns("cvaf_columns.txt"), cvaf_rows(rng, machines, cvaf_ratio, today)),
+        "pssr": write_sheet(wb, "PSSR_Client", PSSR_COLUMNS,
+                            ([f"Client {c}", f"PSSR {c % 12}"] for c in range(1, clients + 1))),
+        "suivi_ps": write_sheet(wb, "Suivi_PS", suivi_columns,
+                                suivi_ps_rows(rng, machines, suivi_ps_ratio, ps_per_machine, suivi_columns, today)),
+        "inspection_rate": write_sheet(wb, "Inspection Rate", inspection_columns,
+                                       inspection_rows(rng, machines, inspection_ratio, inspection_columns, today)),
+        "remote_service": write_sheet(wb, "Remote Service", REMOTE_COLUMNS, remote_rows(rng, machines, remote_ratio)),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb.save(path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Programmes.xlsx")
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--cvaf-ratio", type=float, default=0.5, help="share of machines with a CVA contract")
+    parser.add_argument("--suivi-ps-ratio", type=float, default=0.5, help="share of machines with PS campaigns")
+    parser.add_argument("--ps-per-machine", type=int, default=2, help="max PS campaigns per such machine")
+    parser.add_argument("--inspection-ratio", type=float, default=0.8, help="share of machines with an inspection row")
+    parser.add_argument("--remote-ratio", type=float, default=0.33, help="share of machines on Remote Service")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_data/Programmes.xlsx")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate_workbook(
+        args.output, args.machines, args.cvaf_ratio, args.suivi_ps_ratio, args.ps_per_machine,
+        args.inspection_ratio, args.remote_ratio, args.seed,
+    )
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"Wrote {args.output} ({size_mb:.1f} MB) in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
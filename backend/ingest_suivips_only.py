@@ -7,6 +7,7 @@ from sqlalchemy import select, delete
 from sqlalchemy.dialects.postgresql import insert
 from database import AsyncSessionLocal
 from models import Machine, SuiviPS
+from services.ingestion import convert_date_columns
 
 async def ingest_suivips_only():
     file_path = "data/Programmes.xlsx"
@@ -23,6 +24,7 @@ async def ingest_suivips_only():
         try:
             suivi_df = pd.read_excel(file_path, sheet_name='Suivi_PS')
             print(f"Read {len(suivi_df)} rows from Suivi_PS.")
+            convert_date_columns(suivi_df, ['Letter Date', 'Term Date'])
         except Exception as e:
             print(f"Error reading excel: {e}")
             return
@@ -43,14 +45,14 @@ async def ingest_suivips_only():
 
             suivi_data = {
                 "serial_number": serial,
-                "date": str(row.get('Letter Date')) if not pd.isna(row.get('Letter Date')) else None,
+                "date": row.get('Letter Date'),
                 "client": row.get('Client'),
                 "reference_number": str(row.get('Program Number')) if not pd.isna(row.get('Program Number')) else None,
                 "ps_type": row.get('Service Letter Type'),
                 "status": row.get('Status'),
                 "description": row.get('Description'),
                 "action_required": None,
-                "deadline": str(row.get('Term Date')) if not pd.isna(row.get('Term Date')) else None
+                "deadline": row.get('Term Date')
             }
              # Clean NaNs
             for k, v in suivi_data.items():
@@ -1,7 +1,7 @@
 import asyncio
 from database import AsyncSessionLocal
 from models import User
-from routers.auth import get_password_hash
+from routers.auth import get_password_hash_async
 from sqlalchemy import select
 
 async def create_initial_admin():
@@ -18,7 +18,7 @@ async def create_initial_admin():
         admin_user = User(
             email="admin@neemba.com",
             full_name="Super Admin",
-            password_hash=get_password_hash("admin123"), # Default password
+            password_hash=await get_password_hash_async("admin123"), # Default password
             role="admin",
             is_active=1
         )
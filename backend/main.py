@@ -1,42 +1,106 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
-from database import get_db, AsyncSessionLocal
-from services.ingestion import ingest_programmes_data
-from routers import interventions, machines, auth, admin
+from database import get_db, AsyncSessionLocal, mark_primary_write, engine, read_engine
+from services.search_index import rebuild_suggest_index
+from services.forecast import rebuild_service_forecast
+from services.fleet_snapshot import rebuild_fleet_snapshot
+from services.rollups import ensure_rollups
+from services.meter_history import ensure_upcoming_partitions
+from services.events import broker, start_listener, stop_listener
+from services.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from services import query_debug
+from services.profiling import ProfilingMiddleware
+from routers import interventions, machines, auth, admin, sync, events
 from models import User
-from routers.auth import get_password_hash
+from routers.auth import get_password_hash_async
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
+instrument_engine(engine)
+instrument_engine(read_engine)
+query_debug.install([engine, read_engine])
+
+
+async def refresh_in_memory_indexes(event: dict):
+    # Runs in every worker once a fleet change is committed (via LISTEN/NOTIFY)
+    async with AsyncSessionLocal() as db:
+        await rebuild_suggest_index(db)
+        await rebuild_service_forecast(db)
+        await rebuild_fleet_snapshot(db)
+
+
+async def guard_replica_reads(event: dict):
+    # The replica may not have replayed this commit yet: read from the primary for a while
+    mark_primary_write()
+
+
+async def ensure_admin_user():
+    # Create admin user if not exists
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User).where(User.email == "admin@neemba.com")
+            )
+            user = result.scalar_one_or_none()
+
+            if not user:
+                admin_user = User(
+                    email="admin@neemba.com",
+                    full_name="Admin",
+                    password_hash=await get_password_hash_async("admin123"),
+                    role="admin",
+                    is_active=True,
+                )
+                db.add(admin_user)
+                await db.commit()
+                print("✅ Admin user created")
+            else:
+                print("ℹ️ Admin already exists")
+    except Exception:
+        logger.exception("Admin bootstrap failed")
+
+
+# Background startup work, kept referenced until done
+startup_tasks = set()
+
 
 @app.on_event("startup")
 async def startup_event():
     # Ensure data directory exists
     os.makedirs("data", exist_ok=True)
 
-    # Create admin user if not exists
+    # The admin lookup and bcrypt hash don't gate serving: run them after startup completes
+    task = asyncio.create_task(ensure_admin_user())
+    startup_tasks.add(task)
+    task.add_done_callback(startup_tasks.discard)
+
+    # The in-memory indexes must be built before serving: an empty forecast would be cached
+    # as the answer for the current data version. Same for rollups missing after a migration
+    # (a no-op once they match the data version).
+    await ensure_upcoming_partitions()
     async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(User).where(User.email == "admin@neemba.com")
-        )
-        user = result.scalar_one_or_none()
-
-        if not user:
-            admin_user = User(
-                email="admin@neemba.com",
-                full_name="Admin",
-                password_hash=get_password_hash("admin123"),
-                role="admin",
-                is_active=True,
-            )
-            db.add(admin_user)
-            await db.commit()
-            print("✅ Admin user created")
-        else:
-            print("ℹ️ Admin already exists")
+        await ensure_rollups(db)
+        await rebuild_suggest_index(db)
+        await rebuild_service_forecast(db)
+        await rebuild_fleet_snapshot(db)
+
+    broker.on_change(guard_replica_reads)
+    broker.on_change(refresh_in_memory_indexes)
+    await start_listener()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in startup_tasks:
+        task.cancel()
+    await stop_listener()
 
 
 # Routers
@@ -44,6 +108,8 @@ app.include_router(interventions.router)
 app.include_router(machines.router)
 app.include_router(auth.router)
 app.include_router(admin.router)
+app.include_router(sync.router)
+app.include_router(events.router)
 
 
 # CORS
@@ -54,6 +120,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if query_debug.enabled():
+    # Inside MetricsMiddleware, which counts the request's statements
+    app.add_middleware(query_debug.QueryCountMiddleware)
+# ?profile=1 / X-Profile for admins; inside MetricsMiddleware to attach the request's SQL stats
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so latency includes CORS handling
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -90,7 +163,8 @@ async def upload_machines_excel(
         with open(temp_file, "wb") as f:
             f.write(await file.read())
 
-        # Process the file
+        # Process the file (pandas is imported on first use, not at startup)
+        from services.ingestion import ingest_programmes_data
         stats = await ingest_programmes_data(temp_file, db)
 
         # Clean up
@@ -106,3 +180,10 @@ async def upload_machines_excel(
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
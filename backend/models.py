@@ -1,10 +1,15 @@
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, BigInteger
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, ForeignKey, DateTime, Date, BigInteger, Enum, Index
 from sqlalchemy.orm import relationship
 #from geoalchemy2 import Geometry
 from database import Base
 import datetime
 
+# Native PostgreSQL enums for Intervention columns
+INTERVENTION_TYPES = ('CVAF', 'INSPECTION', 'SUIVI_PS', 'OPPORTUNITY', 'SERVICE')
+INTERVENTION_PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+INTERVENTION_STATUSES = ('PENDING', 'PLANNED', 'COMPLETED', 'CANCELLED')
+
 class Client(Base):
     __tablename__ = "clients"
 
@@ -27,8 +32,9 @@ class Machine(Base):
     
     # IoT Data
     service_meter = Column(Float, nullable=True) # 'Compteur d'entretien (Heures)'
-    last_reported_time = Column(Float, nullable=True) # 'Dernière heure signalée ...' (Excel float date)
+    last_reported_time = Column(DateTime, nullable=True, index=True) # 'Dernière heure signalée ...' (converted from the Excel serial)
     status = Column(String, nullable=True) # 'Dernier statut matériel remonté'
+    status_code = Column(SmallInteger, nullable=False, default=0, server_default="0") # services.status_codes.MACHINE_STATUS_*
     
     # Location
     latitude = Column(Float, nullable=True)
@@ -36,13 +42,17 @@ class Machine(Base):
     #location = Column(Geometry('POINT', srid=4326), nullable=True) # PostGIS column
     
     # Fields from PSSR_Client sheet
-    last_visit = Column(String, nullable=True)
-    next_visit = Column(String, nullable=True)
+    last_visit = Column(Date, nullable=True, index=True)
+    next_visit = Column(Date, nullable=True, index=True)
     psi_status = Column(String, nullable=True) # 'Dernier Rapport' / Inspection status
+    psi_code = Column(SmallInteger, nullable=False, default=0, server_default="0") # services.status_codes.PSI_*
 
     client_id = Column(Integer, ForeignKey("clients.id"), nullable=True)
     client = relationship("Client", back_populates="machines")
 
+    # Data version of the ingestion/regeneration that last changed this machine (delta sync)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
     cvaf = relationship("CVAF", back_populates="machine", uselist=False)
     # pssr relationship removed
     suivi_ps = relationship("SuiviPS", back_populates="machine", uselist=True)
@@ -57,8 +67,8 @@ class CVAF(Base):
     id = Column(Integer, primary_key=True, index=True)
     serial_number = Column(String, ForeignKey("machines.serial_number"), unique=True, index=True)
     
-    start_date = Column(String, nullable=True) # Parsing dates from excel can be tricky, keeping as string for now or DateTime if clean
-    end_date = Column(String, nullable=True)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True, index=True)
     cva_type = Column(String, nullable=True)
     country_code = Column(String, nullable=True)
     product_vertical = Column(String, nullable=True)
@@ -68,6 +78,9 @@ class CVAF(Base):
     inspection_score = Column(String, nullable=True)
     connectivity_score = Column(String, nullable=True)
     sos_score = Column(String, nullable=True)
+    # services.status_codes.SCORE_*
+    inspection_code = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    sos_code = Column(SmallInteger, nullable=False, default=0, server_default="0")
 
     machine = relationship("Machine", back_populates="cvaf")
 
@@ -81,14 +94,14 @@ class SuiviPS(Base):
     id = Column(Integer, primary_key=True, index=True)
     serial_number = Column(String, ForeignKey("machines.serial_number"), index=True)
 
-    date = Column(String, nullable=True)
+    date = Column(Date, nullable=True) # Letter Date
     client = Column(String, nullable=True)
     reference_number = Column(String, nullable=True) # Program Number
     ps_type = Column(String, nullable=True)
     status = Column(String, nullable=True)
     description = Column(String, nullable=True)
     action_required = Column(String, nullable=True)
-    deadline = Column(String, nullable=True)
+    deadline = Column(Date, nullable=True, index=True) # Term Date
 
     machine = relationship("Machine", back_populates="suivi_ps")
 
@@ -101,8 +114,8 @@ class InspectionRate(Base):
     or_segment = Column(String, nullable=True) # N° OR (Segment)
     type_materiel = Column(String, nullable=True)
     atelier = Column(String, nullable=True)
-    date_facture = Column(String, nullable=True)
-    last_inspect = Column(String, nullable=True)
+    date_facture = Column(Date, nullable=True)
+    last_inspect = Column(Date, nullable=True, index=True)
     nbr = Column(Integer, nullable=True)
     nom_client_or = Column(String, nullable=True)
     is_inspected = Column(String, nullable=True)
@@ -116,22 +129,24 @@ class Intervention(Base):
     __tablename__ = "interventions"
 
     id = Column(Integer, primary_key=True, index=True)
-    machine_id = Column(Integer, ForeignKey("machines.id"), index=True)
-    
-    # Types: 'CVAF', 'INSPECTION', 'SUIVI_PS', 'OPPORTUNITY'
-    type = Column(String, index=True)
+    machine_id = Column(Integer, ForeignKey("machines.id"))
     
-    # Priority: 'HIGH', 'MEDIUM', 'LOW'
-    priority = Column(String, index=True)
-    
-    # Status: 'PENDING', 'PLANNED', 'COMPLETED', 'CANCELLED'
-    status = Column(String, default='PENDING', index=True)
+    type = Column(Enum(*INTERVENTION_TYPES, name="intervention_type"))
+    priority = Column(Enum(*INTERVENTION_PRIORITIES, name="intervention_priority"))
+    status = Column(Enum(*INTERVENTION_STATUSES, name="intervention_status"), default='PENDING')
     
     description = Column(String, nullable=True)
     date_created = Column(DateTime, default=datetime.datetime.utcnow)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
     
     machine = relationship("Machine", back_populates="interventions")
 
+    __table_args__ = (
+        # GET /interventions?status=&priority= and the PENDING-per-machine lookups
+        Index("ix_interventions_status_priority", "status", "priority"),
+        Index("ix_interventions_machine_id_status", "machine_id", "status"),
+    )
+
 # Update Machine relationship
 Machine.interventions = relationship("Intervention", back_populates="machine", cascade="all, delete-orphan")
 Machine.remote_service = relationship("RemoteService", back_populates="machine", uselist=False, cascade="all, delete-orphan")
@@ -154,3 +169,91 @@ class User(Base):
     password_hash = Column(String)
     role = Column(String, default="user") # 'admin' or 'user' (read-only)
     is_active = Column(Integer, default=1) # 1=Active, 0=Inactive
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    # Single row (id=1), bumped by every ingestion and intervention regeneration
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class DeletedRow(Base):
+    __tablename__ = "deleted_rows"
+
+    # Tombstones so /sync can report deletions since a given data version
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False) # 'machine' or 'intervention'
+    entity_id = Column(Integer, nullable=False)
+    data_version = Column(BigInteger, nullable=False, index=True)
+
+class StatusCode(Base):
+    __tablename__ = "status_codes"
+
+    # Labels for the small-int codes in services.status_codes
+    domain = Column(String, primary_key=True) # 'machine_status', 'psi_status' or 'cva_score'
+    code = Column(SmallInteger, primary_key=True)
+    label = Column(String, nullable=False)
+
+class MeterReading(Base):
+    __tablename__ = "meter_readings"
+
+    # Append-only service meter history, one row per machine and reported time.
+    # Range-partitioned by month (services.meter_history creates partitions on demand).
+    machine_id = Column(Integer, ForeignKey("machines.id", ondelete="CASCADE"), primary_key=True)
+    reading_time = Column(DateTime, primary_key=True) # 'Heure du dernier signalement ...'
+    service_meter = Column(Float, nullable=False) # hours
+    data_version = Column(BigInteger, nullable=False) # ingestion that recorded it
+
+    __table_args__ = (
+        Index("ix_meter_readings_reading_time_brin", "reading_time", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (reading_time)"},
+    )
+
+class ClientRollup(Base):
+    __tablename__ = "client_rollups"
+
+    # Per-client counts, rebuilt by services.rollups in the transaction of every ingestion and
+    # intervention generation. Statuses as computed by services.status_engine.
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    name = Column(String, nullable=True)
+    pssr = Column(String, nullable=True, index=True)
+    machines = Column(Integer, nullable=False)
+    critical = Column(Integer, nullable=False)
+    maintenance = Column(Integer, nullable=False)
+    operational = Column(Integer, nullable=False)
+    pending_high = Column(Integer, nullable=False) # PENDING interventions by priority
+    pending_medium = Column(Integer, nullable=False)
+    pending_low = Column(Integer, nullable=False)
+    data_version = Column(BigInteger, nullable=False) # version the counts were computed for
+
+class PssrRollup(Base):
+    __tablename__ = "pssr_rollups"
+
+    # Same counts per PSSR (technico-commercial) over their clients' machines.
+    # '' groups the clients without an assigned PSSR (a primary key can't be NULL).
+    pssr = Column(String, primary_key=True)
+    clients = Column(Integer, nullable=False)
+    machines = Column(Integer, nullable=False)
+    critical = Column(Integer, nullable=False)
+    maintenance = Column(Integer, nullable=False)
+    operational = Column(Integer, nullable=False)
+    pending_high = Column(Integer, nullable=False)
+    pending_medium = Column(Integer, nullable=False)
+    pending_low = Column(Integer, nullable=False)
+    data_version = Column(BigInteger, nullable=False)
+
+class FleetRollup(Base):
+    __tablename__ = "fleet_rollups"
+
+    # The same counts over the whole fleet, machines without a client included (the client and
+    # PSSR rollups leave them out). A single row, id 1.
+    id = Column(Integer, primary_key=True)
+    machines = Column(Integer, nullable=False)
+    critical = Column(Integer, nullable=False)
+    maintenance = Column(Integer, nullable=False)
+    operational = Column(Integer, nullable=False)
+    pending_high = Column(Integer, nullable=False)
+    pending_medium = Column(Integer, nullable=False)
+    pending_low = Column(Integer, nullable=False)
+    data_version = Column(BigInteger, nullable=False)
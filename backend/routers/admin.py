@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, text
-from database import get_db, AsyncSessionLocal
-from models import User, Machine, Client, RemoteService, CVAF, SuiviPS, InspectionRate
-from routers.auth import get_current_admin_user, get_password_hash
+from database import get_db, get_read_db, AsyncSessionLocal, pool_status
+from models import User, Machine, Client, RemoteService, CVAF, SuiviPS, InspectionRate, FleetRollup
+from routers.auth import get_current_admin_user, get_password_hash_async, invalidate_principal
 from pydantic import BaseModel
 from typing import List
 import shutil
 import os
-from services.ingestion import ingest_programmes_data
+from services.cache import cached_json_response
+from services.profiling import list_profiles, load_profile
+from services.fleet_snapshot import get_fleet_snapshot
 
 router = APIRouter(
     prefix="/admin",
@@ -34,6 +37,8 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
 
     # Trigger ingestion
     try:
+        from services.ingestion import ingest_programmes_data # pulls in pandas: first use only
+
         # We need an async session for the ingestion service
         async with AsyncSessionLocal() as async_session:
              result = await ingest_programmes_data(file_location, async_session)
@@ -68,6 +73,10 @@ class StatsResponse(BaseModel):
     machines_with_remote: int
     machines_with_vl: int
     clients_count: int
+    # From the rollup tables (services.rollups)
+    critical_machines: int = 0
+    maintenance_machines: int = 0
+    pending_interventions: int = 0
 
 # --- Endpoints ---
 
@@ -79,7 +88,7 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         email=user.email, 
         full_name=user.full_name, 
@@ -112,6 +121,7 @@ async def delete_user(user_id: int, db: Session = Depends(get_db)):
     # Optional: Prevent deleting self?
     # current_admin = ... (context issue, maybe skip for now or handle in frontend)
 
+    await invalidate_principal(db, user.email)
     await db.delete(user)
     await db.commit()
     return {"message": "User deleted"}
@@ -122,6 +132,8 @@ async def update_user(user_id: int, user_update: UserUpdate, db: Session = Depen
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    await invalidate_principal(db, db_user.email)
+
     if user_update.email:
         # Check uniqueness if email changes
         if user_update.email != db_user.email:
@@ -137,34 +149,72 @@ async def update_user(user_id: int, user_update: UserUpdate, db: Session = Depen
         db_user.role = user_update.role
 
     if user_update.password:
-        db_user.password_hash = get_password_hash(user_update.password)
+        db_user.password_hash = await get_password_hash_async(user_update.password)
 
     await db.commit()
     await db.refresh(db_user)
     return db_user
 
 @router.get("/stats", response_model=StatsResponse)
-async def get_system_stats(db: Session = Depends(get_db)):
-    # Total Machines
-    total_machines = await db.scalar(select(func.count(Machine.id)))
+async def get_system_stats(request: Request, db: Session = Depends(get_read_db)):
+    async def build():
+        # Total Machines
+        total_machines = await db.scalar(select(func.count(Machine.id)))
     
-    # Clients
-    clients_count = await db.scalar(select(func.count(Client.id)))
+        # Clients
+        clients_count = await db.scalar(select(func.count(Client.id)))
 
-    # Machines with Remote Service (flash_update is not null)
-    remote_count = await db.scalar(select(func.count(RemoteService.id)))
+        # Machines with Remote Service (flash_update is not null)
+        remote_count = await db.scalar(select(func.count(RemoteService.id)))
 
-    # Machines with VisionLink (roughly implied by having coordinates or specific VL columns if we had them distinct)
-    # For now, let's use location is not null as a proxy for "Connected/Located"
-    connected_count = await db.scalar(select(func.count(Machine.id)).where(Machine.location != None))
+        # Machines with VisionLink (roughly implied by having coordinates or specific VL columns if we had them distinct)
+        # For now, let's use coordinates being set as a proxy for "Connected/Located"
+        connected_count = await db.scalar(
+            select(func.count(Machine.id)).where(Machine.latitude.isnot(None), Machine.longitude.isnot(None))
+        )
     
-    # Or strict VL check if we have a VL table? We don't have a dedicated VL table, it's mixed in Machine.
-    # Let's count those with valid coordinates as "Connected"
+        # Or strict VL check if we have a VL table? We don't have a dedicated VL table, it's mixed in Machine.
+        # Let's count those with valid coordinates as "Connected"
+
+        # Status and intervention totals: the fleet rollup row (machines without a client included)
+        fleet = await db.get(FleetRollup, 1)
+        critical = fleet.critical if fleet else 0
+        maintenance = fleet.maintenance if fleet else 0
+        pending = fleet.pending_high + fleet.pending_medium + fleet.pending_low if fleet else 0
     
-    return {
-        "total_machines": total_machines or 0,
-        "connected_machines": connected_count or 0,
-        "machines_with_remote": remote_count or 0,
-        "machines_with_vl": connected_count or 0, # Placeholder
-        "clients_count": clients_count or 0
-    }
+        return {
+            "total_machines": total_machines or 0,
+            "connected_machines": connected_count or 0,
+            "machines_with_remote": remote_count or 0,
+            "machines_with_vl": connected_count or 0, # Placeholder
+            "clients_count": clients_count or 0,
+            "critical_machines": critical or 0,
+            "maintenance_machines": maintenance or 0,
+            "pending_interventions": pending or 0,
+        }
+    return await cached_json_response(request, db, build)
+
+@router.get("/db-pool")
+async def get_db_pool_status():
+    """Connection pool usage for this worker; multiply by worker count when sizing against max_connections."""
+    return pool_status()
+
+@router.get("/fleet-snapshot")
+async def get_fleet_snapshot_status():
+    """Size, data version and last rebuild time of this worker's in-memory fleet snapshot."""
+    return get_fleet_snapshot().stats()
+
+@router.get("/profiles")
+async def get_profiles():
+    """Stored request profiles (newest first): send X-Profile: 1 or ?profile=1 with an admin token to record one."""
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Folded stacks, for flamegraph.pl, speedscope or inferno."""
+    folded = load_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        folded, headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
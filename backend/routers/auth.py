@@ -1,5 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
@@ -9,6 +11,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy.future import select
 from database import get_db
 from models import User
+from services.cache import TTLCache
+from services import events
 
 # --- Configuration ---
 import os
@@ -18,7 +22,18 @@ SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_THIS_TO_A_SECURE_SECRET_KEY_IN_PROD
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
 
+# Resolved users keyed by token subject (email). The TTL bounds staleness if an invalidation is missed.
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CHANNEL = "principal_invalidations"
+
+# bcrypt is deliberately slow (~100s of ms) and releases the GIL: run it in a small
+# dedicated pool so it never blocks the event loop. The pool size is the concurrency limit;
+# extra logins queue instead of starving the CPU.
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY", "2"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_CONCURRENCY, thread_name_prefix="bcrypt")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 router = APIRouter(
@@ -26,6 +41,10 @@ router = APIRouter(
     tags=["authentication"]
 )
 
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+# Invalidations are broadcast so every worker drops its copy
+events.listen(PRINCIPAL_CHANNEL, principal_cache.invalidate)
+
 # --- Schemas ---
 class Token(BaseModel):
     access_token: str
@@ -48,6 +67,19 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bcrypt_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bcrypt_executor, get_password_hash, password)
+
+async def invalidate_principal(db, email: str):
+    """Drops the cached user now, and in every worker once the caller commits."""
+    principal_cache.invalidate(email)
+    await events.notify(db, PRINCIPAL_CHANNEL, email)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -73,12 +105,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
+    user = principal_cache.get(token_data.email)
+    if user is not None:
+        return user
+
     stmt = select(User).where(User.email == token_data.email)
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
     
     if user is None:
         raise credentials_exception
+    # Detach so the cached instance is shared read-only across requests
+    db.expunge(user)
+    principal_cache.set(token_data.email, user)
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -99,7 +138,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -0,0 +1,58 @@
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+import orjson
+from database import AsyncSessionLocal
+from services.data_version import get_data_version
+from services.events import broker
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"]
+)
+
+KEEPALIVE_SECONDS = 15
+
+def format_sse(event: str, data: dict, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {orjson.dumps(data).decode()}")
+    return "\n".join(lines) + "\n\n"
+
+@router.get("/fleet")
+async def stream_fleet_changes(request: Request):
+    """
+    Server-sent events stream of fleet changes.
+
+    - `hello` on connect, with the current data version (compare it to the one you hold),
+    - `fleet-change` after each committed ingestion / intervention regeneration:
+      {version, job, status, count, machine_ids} (machine_ids is null when truncated or on resync).
+    Clients then call GET /sync/?since=<their version> to fetch only what changed.
+    """
+    # Short-lived session: the stream itself must not hold a pooled connection
+    async with AsyncSessionLocal() as db:
+        version = await get_data_version(db)
+
+    queue = broker.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse("hello", {"version": version}, version)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse("fleet-change", event, event.get("version"))
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
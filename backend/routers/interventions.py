@@ -1,11 +1,12 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
-from database import get_db
-from models import Intervention
+from database import get_db, get_read_db
+from models import Intervention, INTERVENTION_PRIORITIES, INTERVENTION_STATUSES
 from services.intervention_service import generate_interventions
+from services.cache import cached_json_response
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -39,22 +40,35 @@ async def generate_intervention_plan(db: AsyncSession = Depends(get_db)):
 
 @router.get("/", response_model=List[InterventionResponse])
 async def get_interventions(
+    request: Request,
     priority: Optional[str] = None,
     status: Optional[str] = None,
     machine_id: Optional[int] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Fetch interventions with optional filtering.
     """
-    stmt = select(Intervention)
-    
-    if priority:
-        stmt = stmt.where(Intervention.priority == priority)
-    if status:
-        stmt = stmt.where(Intervention.status == status)
-    if machine_id:
-        stmt = stmt.where(Intervention.machine_id == machine_id)
-        
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    # Enum columns: an unknown value would be a database error, reject it up front
+    if priority and priority not in INTERVENTION_PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority. Allowed: {', '.join(INTERVENTION_PRIORITIES)}")
+    if status and status not in INTERVENTION_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status. Allowed: {', '.join(INTERVENTION_STATUSES)}")
+
+    async def build():
+        # Select plain columns: rows are encoded as-is, no ORM hydration
+        stmt = select(
+            Intervention.id, Intervention.machine_id, Intervention.type, Intervention.priority,
+            Intervention.status, Intervention.description, Intervention.date_created
+        )
+
+        if priority:
+            stmt = stmt.where(Intervention.priority == priority)
+        if status:
+            stmt = stmt.where(Intervention.status == status)
+        if machine_id:
+            stmt = stmt.where(Intervention.machine_id == machine_id)
+
+        result = await db.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+    return await cached_json_response(request, db, build)
@@ -1,12 +1,23 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
+from sqlalchemy import select, or_, func, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
 from sqlalchemy.orm import selectinload
 from typing import List, Optional, Any
-from database import get_db
-from models import Machine, Client, Intervention, CVAF, InspectionRate, RemoteService, SuiviPS
+from datetime import date, datetime
+from database import get_read_db
+from models import Machine, Client, Intervention, CVAF, InspectionRate, RemoteService, SuiviPS, ClientRollup, PssrRollup
+from services.search_index import get_suggest_index
+from services.cache import cached_json_response, versioned_json_response
+from services.fleet_snapshot import current_fleet_snapshot
+from services.status_engine import STATUS_NAMES, machine_statuses
+from services.meter_history import get_usage_rates
+from services.forecast import get_service_forecast
+from services.status_codes import MACHINE_STATUS_URGENT, PSI_NOT_INSPECTED, LOW_SCORE_CODES
 from pydantic import BaseModel
+import numpy as np
 
 router = APIRouter(
     prefix="/machines",
@@ -45,7 +56,7 @@ class MachineDTO(BaseModel):
 class ProgramStatusDTO(BaseModel):
     visionLink: bool
     cvaf: Optional[str] = None # 'Active', 'Expired', etc.
-    inspection: Optional[str] = None # Date of last inspection
+    inspection: Optional[date] = None # Date of last inspection
     remoteService: Optional[str] = None # Flash update status
     suiviPs: Optional[int] = 0 # Count of active campaigns
 
@@ -61,69 +72,121 @@ class MachineContextDTO(BaseModel):
     class Config:
         from_attributes = True
 
+class MapPointDTO(BaseModel):
+    id: int
+    serialNumber: str
+    lat: float
+    lng: float
+    status: str
+
 class ClientStatsDTO(BaseModel):
     name: str
     count: int
 
-def calculate_machine_status_and_interventions(m: Machine):
+class RollupCountsDTO(BaseModel):
+    machines: int
+    critical: int
+    maintenance: int
+    operational: int
+    pendingHigh: int # PENDING interventions by priority
+    pendingMedium: int
+    pendingLow: int
+    dataVersion: int
+
+class ClientRollupDTO(RollupCountsDTO):
+    clientId: int
+    name: Optional[str] = None
+    pssr: Optional[str] = None
+
+class PssrRollupDTO(RollupCountsDTO):
+    pssr: Optional[str] = None # null: clients without an assigned PSSR
+    clients: int
+
+class UsageRateDTO(BaseModel):
+    machineId: int
+    serialNumber: str
+    readings: int
+    firstReading: datetime
+    latestReading: datetime
+    latestMeter: float
+    hoursPerDay: Optional[float] = None # trend over the window
+    recentHoursPerDay: Optional[float] = None # between the two latest readings
+
+class ServiceDueDTO(BaseModel):
+    machineId: int
+    serialNumber: str
+    client: str
+    latestMeter: float
+    latestReading: datetime
+    hoursPerDay: float
+    nextServiceHours: float
+    dueDate: date
+    daysUntilDue: float # negative when overdue
+
+class SuggestionDTO(BaseModel):
+    id: int
+    label: str
+    serialNumber: Optional[str] = None
+    model: Optional[str] = None
+    client: Optional[str] = None
+
+def is_urgent_excel_status(m: Machine) -> bool:
+    return m.status_code == MACHINE_STATUS_URGENT
+
+def is_urgent_cva_score(m: Machine) -> bool:
+    # CVA Logic (RED if 0/1)
+    return bool(m.cvaf) and (m.cvaf.sos_code in LOW_SCORE_CODES or m.cvaf.inspection_code in LOW_SCORE_CODES)
+
+def compute_machine_status(m: Machine) -> str:
+    """
+    Status only. Reads m.interventions, m.cvaf and m.remote_service (never m.suivi_ps),
+    so callers that only need the status can skip loading the other relationships.
+    Reference for the bulk evaluator in services.status_engine, which lists use.
+    """
+    pending = [i for i in m.interventions if i.status == 'PENDING']
+
+    # 1. Critical (RED)
+    if is_urgent_excel_status(m) or any(i.priority == 'HIGH' for i in pending) or is_urgent_cva_score(m):
+        return 'critical'
+
+    # 2. Maintenance (ORANGE)
+    if m.psi_code == PSI_NOT_INSPECTED:
+        return 'maintenance'
+    if m.remote_service and m.remote_service.flash_update == '1':
+        return 'maintenance'
+    if any(i.priority == 'MEDIUM' for i in pending):
+        return 'maintenance'
+
+    return 'operational'
+
+def evaluate_machine(m: Machine):
     """
     Central logic to determine machine status and synthesize virtual interventions.
+    Interventions are returned as plain dicts so list endpoints can encode them directly.
     """
-    status = 'operational'
+    status = compute_machine_status(m)
     virtual_interventions = []
-    
-    # helper for scores
-    def is_low_score(val):
-        if val is None: return False
-        s_val = str(val).strip().lower()
-        if s_val in ['0', '1', '0.0', '1.0', '0/1']:
-            return True
-        if '/' in s_val:
-            parts = [p.strip() for p in s_val.split('/')]
-            if parts[0] == '0' and len(parts) > 1 and parts[1] != '0':
-                return True
-        return False
-
-    # 1. Check for Critical (RED)
-    has_urgent_intervention = any(i.priority == 'HIGH' for i in m.interventions if i.status == 'PENDING')
-    excel_status_raw = str(m.status).lower() if m.status else ""
-    is_urgent_excel = any(term in excel_status_raw for term in ["défaut", "urgent", "critique", "critical", "breakdown"])
-    
-    # CVA Logic (RED if 0/1)
-    is_urgent_cva_score = False
-    if m.cvaf:
-        sos = m.cvaf.sos_score
-        insp = m.cvaf.inspection_score
-        if is_low_score(sos) or is_low_score(insp):
-            is_urgent_cva_score = True
 
-    if is_urgent_excel:
+    if is_urgent_excel_status(m):
         virtual_interventions.append({
             "id": -1, "type": "ALERTE", "priority": "HIGH", "status": "PENDING", 
             "description": f"Statut Excel: {m.status}", "date_created": m.last_reported_time
         })
-        status = 'critical'
-    elif has_urgent_intervention:
-        status = 'critical'
-    elif is_urgent_cva_score:
-        status = 'critical'
 
-    # 2. Virtual Interventions Details
     if m.cvaf:
         virtual_interventions.append({
             "id": -3, "type": "CONTRAT CVA", 
-            "priority": "HIGH" if is_urgent_cva_score else "LOW", 
+            "priority": "HIGH" if is_urgent_cva_score(m) else "LOW", 
             "status": "PENDING",
             "description": f"Type: {m.cvaf.cva_type} | SOS: {m.cvaf.sos_score or 'N/A'} | Insp: {m.cvaf.inspection_score or 'N/A'}", 
             "date_created": None
         })
 
-    if m.psi_status == 'Non Inspecté':
-         virtual_interventions.append({
+    if m.psi_code == PSI_NOT_INSPECTED:
+        virtual_interventions.append({
             "id": -2, "type": "INSPECTION", "priority": "MEDIUM", "status": "PENDING",
             "description": "Machine non inspectée (PSI)", "date_created": None
         })
-         if status == 'operational': status = 'maintenance'
 
     if m.suivi_ps:
         for i, ps in enumerate(m.suivi_ps):
@@ -137,132 +200,387 @@ def calculate_machine_status_and_interventions(m: Machine):
             "id": -4, "type": "REMOTE SERVICE", "priority": "MEDIUM", "status": "PENDING",
             "description": "Mise à jour Flash requise", "date_created": None
         })
-        if status == 'operational': status = 'maintenance'
-        
-    # Medium priority interventions
-    has_medium_intervention = any(i.priority == 'MEDIUM' for i in m.interventions if i.status == 'PENDING')
-    if has_medium_intervention and status == 'operational':
-         status = 'maintenance'
 
     # Combine
     all_interventions = [
-        InterventionDTO(
-            id=i.id, type=i.type, priority=i.priority, status=i.status,
-            description=i.description, date_created=i.date_created
-        ) for i in m.interventions if i.status == 'PENDING'
-    ] + [InterventionDTO(**vi) for vi in virtual_interventions]
+        {
+            "id": i.id, "type": i.type, "priority": i.priority, "status": i.status,
+            "description": i.description, "date_created": i.date_created
+        } for i in m.interventions if i.status == 'PENDING'
+    ] + virtual_interventions
 
     return status, all_interventions
 
+def calculate_machine_status_and_interventions(m: Machine):
+    status, interventions = evaluate_machine(m)
+    return status, [InterventionDTO(**i) for i in interventions]
+
+# --- Sparse fieldsets (?fields=) and embedded relations (?include=) ---
+
+MACHINE_FIELDS = ["id", "serialNumber", "model", "client", "location", "status", "pendingInterventions"]
+CONTEXT_FIELDS = ["id", "serialNumber", "model", "client", "location", "status", "programs"]
+
+# Relationships an output field needs loaded. Client name comes from a join, never a relationship load.
+STATUS_RELATIONS = {"interventions", "cvaf", "remote_service"}
+FIELD_RELATIONS = {
+    "status": STATUS_RELATIONS,
+    "pendingInterventions": STATUS_RELATIONS | {"suivi_ps"},
+    "programs": {"cvaf", "remote_service"},
+}
+
+# ?include= name -> Machine relationship embedded as raw rows
+INCLUDE_RELATIONS = {
+    "interventions": "interventions",
+    "cvaf": "cvaf",
+    "suiviPs": "suivi_ps",
+    "inspectionRate": "inspection_rate",
+    "remoteService": "remote_service",
+}
+
+def machine_id_in(ids: List[int]):
+    # One array parameter instead of one bind per id (asyncpg caps a statement at 32767 parameters)
+    return Machine.id == any_(bindparam("machine_ids", ids, type_=ARRAY(Integer)))
+
+def parse_list_param(value: Optional[str], allowed: List[str], name: str, default: List[str]) -> List[str]:
+    if value is None:
+        return default
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in items if v not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {name}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return items
+
+def relation_loaders(fields: List[str], include: List[str]):
+    relations = set()
+    for f in fields:
+        relations |= FIELD_RELATIONS.get(f, set())
+    relations.update(INCLUDE_RELATIONS[i] for i in include)
+    return [selectinload(getattr(Machine, r)) for r in sorted(relations)]
+
+def row_to_dict(obj) -> Optional[dict]:
+    if obj is None:
+        return None
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+def embed_relations(out: dict, m: Machine, include: List[str]) -> dict:
+    for name in include:
+        value = getattr(m, INCLUDE_RELATIONS[name])
+        out[name] = [row_to_dict(v) for v in value] if isinstance(value, list) else row_to_dict(value)
+    return out
+
+def machine_to_dict(m: Machine, client_name: Optional[str], fields: List[str] = MACHINE_FIELDS, include: List[str] = (),
+                    status: Optional[str] = None) -> dict:
+    """
+    Same shape as MachineDTO (restricted to `fields`), without building Pydantic objects.
+    Pass `status` when it was evaluated in bulk for the whole list.
+    """
+    interventions = None
+    if "pendingInterventions" in fields:
+        evaluated, interventions = evaluate_machine(m)
+        status = status or evaluated
+    elif "status" in fields and status is None:
+        status = compute_machine_status(m)
+
+    out = {}
+    for f in fields:
+        if f == "id":
+            out["id"] = m.id
+        elif f == "serialNumber":
+            out["serialNumber"] = m.serial_number
+        elif f == "model":
+            out["model"] = m.model
+        elif f == "client":
+            out["client"] = client_name if client_name is not None else "Unknown Client"
+        elif f == "location":
+            out["location"] = {
+                "lat": m.latitude if m.latitude else 0.0,
+                "lng": m.longitude if m.longitude else 0.0,
+                "address": client_name if client_name is not None else "",
+            }
+        elif f == "status":
+            out["status"] = status
+        elif f == "pendingInterventions":
+            out["pendingInterventions"] = interventions
+    return embed_relations(out, m, include)
+
+@router.get("/suggest", response_model=List[SuggestionDTO])
+async def suggest_machines(q: str, limit: int = Query(10, ge=1, le=50)):
+    """Autocomplete on serial, model and client name, served from the in-memory index (no DB access)."""
+    return get_suggest_index().suggest(q, limit)
+
 @router.get("/global-search", response_model=List[MachineContextDTO])
 async def search_global_context(
+    request: Request,
     q: str,
-    db: AsyncSession = Depends(get_db)
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(CONTEXT_FIELDS)}"),
+    include: Optional[str] = Query(None, description=f"Comma-separated relations to embed: {', '.join(INCLUDE_RELATIONS)}"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    search_term = f"%{q}%"
-    query = select(Machine).options(
-        selectinload(Machine.client),
-        selectinload(Machine.interventions),
-        selectinload(Machine.cvaf),
-        selectinload(Machine.inspection_rate),
-        selectinload(Machine.remote_service),
-        selectinload(Machine.suivi_ps)
-    ).outerjoin(Client).where(
-        or_(
-            Client.name.ilike(search_term),
-            Machine.serial_number.ilike(search_term),
-            Machine.model.ilike(search_term)
-        )
-    )
-    
-    result = await db.execute(query)
-    machines = result.scalars().all()
-    
-    response = []
-    for m in machines:
-        is_connected = m.latitude is not None and m.longitude is not None
-        status, _ = calculate_machine_status_and_interventions(m)
-        
-        cvaf_status = m.cvaf.cva_type if m.cvaf else None
-        inspection_status = m.inspection_rate[0].last_inspect if m.inspection_rate else None
-        remote_status = m.remote_service.flash_update if m.remote_service else None
-        suivi_count = len(m.suivi_ps) if m.suivi_ps else 0
-        
-        loc_dto = LocationDTO(lat=m.latitude, lng=m.longitude, address=m.client.name if m.client else "") if is_connected else None
-
-        dto = MachineContextDTO(
-            id=m.id,
-            serialNumber=m.serial_number,
-            model=m.model,
-            client=m.client.name if m.client else "Unknown",
-            location=loc_dto,
-            status=status,
-            programs=ProgramStatusDTO(
-                visionLink=is_connected,
-                cvaf=cvaf_status,
-                inspection=inspection_status,
-                remoteService=remote_status,
-                suiviPs=suivi_count
+    field_list = parse_list_param(fields, CONTEXT_FIELDS, "fields", CONTEXT_FIELDS)
+    include_list = parse_list_param(include, list(INCLUDE_RELATIONS), "include", [])
+
+    async def build():
+        search_term = f"%{q}%"
+        columns = [Machine, Client.name]
+        with_programs = "programs" in field_list
+        if with_programs:
+            # Counts and first inspection row via subqueries instead of loading whole collections
+            columns += [
+                select(func.count(SuiviPS.id))
+                .where(SuiviPS.serial_number == Machine.serial_number)
+                .scalar_subquery(),
+                select(InspectionRate.last_inspect)
+                .where(InspectionRate.serial_number == Machine.serial_number)
+                .order_by(InspectionRate.id)
+                .limit(1)
+                .scalar_subquery(),
+            ]
+        query = select(*columns).options(
+            *relation_loaders(field_list, include_list)
+        ).outerjoin(Client, Machine.client_id == Client.id).where(
+            or_(
+                Client.name.ilike(search_term),
+                Machine.serial_number.ilike(search_term),
+                Machine.model.ilike(search_term)
             )
         )
-        response.append(dto)
-    return response
+
+        rows = (await db.execute(query)).all()
+        statuses = machine_statuses(row[0] for row in rows) if "status" in field_list else [None] * len(rows)
+
+        response = []
+        for row, status in zip(rows, statuses):
+            m, client_name = row[0], row[1]
+            is_connected = m.latitude is not None and m.longitude is not None
+
+            out = {}
+            for f in field_list:
+                if f == "id":
+                    out["id"] = m.id
+                elif f == "serialNumber":
+                    out["serialNumber"] = m.serial_number
+                elif f == "model":
+                    out["model"] = m.model
+                elif f == "client":
+                    out["client"] = client_name if client_name is not None else "Unknown"
+                elif f == "location":
+                    out["location"] = {
+                        "lat": m.latitude, "lng": m.longitude,
+                        "address": client_name if client_name is not None else ""
+                    } if is_connected else None
+                elif f == "status":
+                    out["status"] = status
+                elif f == "programs":
+                    out["programs"] = {
+                        "visionLink": is_connected,
+                        "cvaf": m.cvaf.cva_type if m.cvaf else None,
+                        "inspection": row[3],
+                        "remoteService": m.remote_service.flash_update if m.remote_service else None,
+                        "suiviPs": row[2] or 0,
+                    }
+            response.append(embed_relations(out, m, include_list))
+        return response
+    return await cached_json_response(request, db, build)
 
 @router.get("/", response_model=List[MachineDTO])
 async def get_machines(
+    request: Request,
     skip: int = 0, 
     limit: int = 1000, 
     serialNumber: Optional[str] = None,
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(MACHINE_FIELDS)}"),
+    include: Optional[str] = Query(None, description=f"Comma-separated relations to embed: {', '.join(INCLUDE_RELATIONS)}"),
+    cvaEndingWithinDays: Optional[int] = Query(None, ge=0, description="Only machines whose CVA contract ends within N days"),
+    psOverdue: Optional[bool] = Query(None, description="Only machines with an Open PS campaign past its term date"),
+    dueWithinDays: Optional[int] = Query(None, ge=0, description="Only machines forecast to reach their next service within N days"),
+    status: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(STATUS_NAMES)}"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = select(Machine).options(
-        selectinload(Machine.client),
-        selectinload(Machine.interventions),
-        selectinload(Machine.suivi_ps),
-        selectinload(Machine.remote_service),
-        selectinload(Machine.cvaf),
-        selectinload(Machine.inspection_rate)
-    )
-    
-    if serialNumber:
-        query = query.where(Machine.serial_number == serialNumber)
-    if search:
-        search_term = f"%{search}%"
-        query = query.outerjoin(Client).where(
-            or_(Machine.serial_number.ilike(search_term), Machine.model.ilike(search_term), Client.name.ilike(search_term))
+    """
+    Machines in id order. Filtering and paging run on the in-memory fleet snapshot; Postgres is only
+    queried to hydrate pendingInterventions or ?include= relations for the requested page.
+    """
+    field_list = parse_list_param(fields, MACHINE_FIELDS, "fields", MACHINE_FIELDS)
+    include_list = parse_list_param(include, list(INCLUDE_RELATIONS), "include", [])
+    status_list = parse_list_param(status, list(STATUS_NAMES), "status", [])
+    today = date.today()
+
+    snapshot = await current_fleet_snapshot()
+    forecast = get_service_forecast()
+    positions = snapshot.filter(
+        serial_number=serialNumber,
+        search=search,
+        cva_ending_within_days=cvaEndingWithinDays,
+        ps_overdue=psOverdue,
+        machine_ids=forecast.machine_ids_due_within(dueWithinDays) if dueWithinDays is not None else None,
+        statuses=status_list,
+        today=today,
+    )[max(skip, 0):max(skip, 0) + max(limit, 0)]
+    # Relative date filters change with the calendar day, not only with the data version
+    relative = cvaEndingWithinDays is not None or psOverdue is not None or dueWithinDays is not None
+    day_key = today if relative else None
+    if dueWithinDays is not None:
+        # The forecast is rebuilt separately from the snapshot and may be at another version
+        day_key = (today, forecast.data_version)
+
+    if "pendingInterventions" not in field_list and not include_list:
+        async def build_from_snapshot():
+            return snapshot.machine_rows(positions, field_list)
+        return await versioned_json_response(request, snapshot.data_version, build_from_snapshot, extra_key=day_key)
+
+    async def build():
+        page_ids = [int(i) for i in snapshot.ids[positions]]
+        if not page_ids:
+            return []
+        # Statuses come from the snapshot: status alone needs no relationship loaded
+        loaded_fields = [f for f in field_list if f != "status"]
+        result = await db.execute(
+            select(Machine, Client.name).options(
+                *relation_loaders(loaded_fields, include_list)
+            ).outerjoin(Client, Machine.client_id == Client.id).where(machine_id_in(page_ids))
         )
-        
-    result = await db.execute(query.limit(limit).offset(skip))
-    machines = result.scalars().all()
-    
-    response = []
-    for m in machines:
-        status, interventions = calculate_machine_status_and_interventions(m)
-        lat = m.latitude if m.latitude else 0.0
-        lng = m.longitude if m.longitude else 0.0
-        
-        response.append(MachineDTO(
-            id=m.id,
-            serialNumber=m.serial_number,
-            model=m.model,
-            client=m.client.name if m.client else "Unknown Client",
-            location=LocationDTO(lat=lat, lng=lng, address=m.client.name if m.client else ""),
-            status=status,
-            pendingInterventions=interventions
-        ))
-    return response
+        machines_by_id = {m.id: (m, client_name) for m, client_name in result.all()}
+        statuses = dict(zip(page_ids, (STATUS_NAMES[s] for s in snapshot.status[positions])))
+        return [
+            machine_to_dict(*machines_by_id[i], field_list, include_list, status=statuses[i])
+            for i in page_ids if i in machines_by_id
+        ]
+    # The page was selected from the snapshot: its version is part of the key
+    return await cached_json_response(request, db, build, extra_key=(day_key, snapshot.data_version))
+
+@router.get("/map", response_model=List[MapPointDTO])
+async def get_machine_map(
+    request: Request,
+    status: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(STATUS_NAMES)}"),
+    minLat: Optional[float] = None,
+    maxLat: Optional[float] = None,
+    minLng: Optional[float] = None,
+    maxLng: Optional[float] = None,
+):
+    """Located machines as map markers (optionally within a bounding box), served from the fleet snapshot."""
+    status_list = parse_list_param(status, list(STATUS_NAMES), "status", [])
+    snapshot = await current_fleet_snapshot()
+
+    async def build():
+        positions = snapshot.filter(statuses=status_list, located=True)
+        lat, lng = snapshot.lat[positions], snapshot.lng[positions]
+        inside = np.ones(len(positions), dtype=bool)
+        if minLat is not None:
+            inside &= lat >= minLat
+        if maxLat is not None:
+            inside &= lat <= maxLat
+        if minLng is not None:
+            inside &= lng >= minLng
+        if maxLng is not None:
+            inside &= lng <= maxLng
+        return snapshot.map_points(positions[inside])
+    return await versioned_json_response(request, snapshot.data_version, build)
+
+@router.get("/usage", response_model=List[UsageRateDTO])
+async def get_usage_rates_endpoint(
+    request: Request,
+    windowDays: int = Query(90, ge=1, le=3650),
+    machineId: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Service-meter usage rates per machine, from the meter reading history."""
+    async def build():
+        return [
+            {
+                "machineId": row["machine_id"],
+                "serialNumber": row["serial_number"],
+                "readings": row["readings"],
+                "firstReading": row["first_reading"],
+                "latestReading": row["latest_reading"],
+                "latestMeter": row["latest_meter"],
+                "hoursPerDay": row["hours_per_day"],
+                "recentHoursPerDay": row["recent_hours_per_day"],
+            }
+            for row in await get_usage_rates(db, windowDays, machineId)
+        ]
+    # The window is relative to now
+    return await cached_json_response(request, db, build, extra_key=date.today())
+
+@router.get("/service-due", response_model=List[ServiceDueDTO])
+async def get_service_due(
+    request: Request,
+    withinDays: int = Query(30, ge=0, le=365),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Machines forecast to reach their next service-hour threshold within N days, soonest first."""
+    # Keyed on the forecast's own version: it is rebuilt after the commit, by the change hook, so
+    # the database may already be at a newer version than the forecast being served
+    forecast = get_service_forecast()
+
+    async def build():
+        rows = forecast.rows(forecast.due_within(withinDays))
+        if not rows:
+            return []
+        result = await db.execute(
+            select(Machine.id, Machine.serial_number, Client.name)
+            .outerjoin(Client, Machine.client_id == Client.id)
+            .where(machine_id_in([r["machine_id"] for r in rows]))
+        )
+        names = {row[0]: (row[1], row[2]) for row in result.all()}
+        response = []
+        for r in rows:
+            if r["machine_id"] not in names:
+                continue
+            serial, client_name = names[r["machine_id"]]
+            response.append({
+                "machineId": r["machine_id"],
+                "serialNumber": serial,
+                "client": client_name if client_name is not None else "Unknown Client",
+                "latestMeter": r["latest_meter"],
+                "latestReading": r["latest_reading"],
+                "hoursPerDay": round(r["hours_per_day"], 2),
+                "nextServiceHours": r["next_service_hours"],
+                "dueDate": r["due_date"],
+                "daysUntilDue": r["days_until_due"],
+            })
+        return response
+    return await versioned_json_response(request, forecast.data_version, build, extra_key=date.today())
 
 @router.get("/clients", response_model=List[ClientStatsDTO])
-async def get_all_clients(db: AsyncSession = Depends(get_db)):
-    """Returns a list of all unique clients with their machine counts."""
-    query = (
-        select(Client.name, func.count(Machine.id).label("count"))
-        .join(Machine, Machine.client_id == Client.id)
-        .group_by(Client.name)
-        .order_by(Client.name)
-    )
-    result = await db.execute(query)
-    rows = result.all()
-    
-    return [ClientStatsDTO(name=row[0], count=row[1]) for row in rows]
+async def get_all_clients(request: Request):
+    """Returns a list of all unique clients with their machine counts (from the fleet snapshot)."""
+    snapshot = await current_fleet_snapshot()
+
+    async def build():
+        return snapshot.client_counts()
+    return await versioned_json_response(request, snapshot.data_version, build)
+
+def rollup_counts(r) -> dict:
+    return {
+        "machines": r.machines, "critical": r.critical, "maintenance": r.maintenance, "operational": r.operational,
+        "pendingHigh": r.pending_high, "pendingMedium": r.pending_medium, "pendingLow": r.pending_low,
+        "dataVersion": r.data_version,
+    }
+
+@router.get("/rollups/clients", response_model=List[ClientRollupDTO])
+async def get_client_rollups(
+    request: Request,
+    pssr: Optional[str] = Query(None, description="Only this PSSR's clients ('' for clients without one)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Per-client machine counts by status and pending interventions by priority (precomputed, services.rollups)."""
+    async def build():
+        query = select(ClientRollup).order_by(ClientRollup.name, ClientRollup.client_id)
+        if pssr is not None:
+            query = query.where(ClientRollup.pssr.is_(None) | (ClientRollup.pssr == "")) if pssr == "" \
+                else query.where(ClientRollup.pssr == pssr)
+        rows = (await db.execute(query)).scalars().all()
+        return [{"clientId": r.client_id, "name": r.name, "pssr": r.pssr, **rollup_counts(r)} for r in rows]
+    return await cached_json_response(request, db, build)
+
+@router.get("/rollups/pssr", response_model=List[PssrRollupDTO])
+async def get_pssr_rollups(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """The same counts per PSSR, over their clients' machines."""
+    async def build():
+        rows = (await db.execute(select(PssrRollup).order_by(PssrRollup.pssr))).scalars().all()
+        return [{"pssr": r.pssr or None, "clients": r.clients, **rollup_counts(r)} for r in rows]
+    return await cached_json_response(request, db, build)
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List
+from database import get_read_db
+from models import Machine, Client, Intervention, DeletedRow
+from routers.machines import MachineDTO, MACHINE_FIELDS, machine_to_dict, relation_loaders
+from routers.interventions import InterventionResponse
+from services.cache import cached_json_response
+from services.data_version import get_data_version, oldest_syncable_version
+from pydantic import BaseModel
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+class DeletedDTO(BaseModel):
+    machines: List[int] = []
+    interventions: List[int] = []
+
+class SyncResponse(BaseModel):
+    version: int
+    since: int
+    reset: bool # True when `since` is too old: the payload is a full snapshot, drop local state
+    machines: List[MachineDTO]
+    interventions: List[InterventionResponse]
+    deleted: DeletedDTO
+
+@router.get("/", response_model=SyncResponse)
+async def sync_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Data version the client already has (0 = full download)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Machines and interventions upserted or deleted after data version `since`.
+    Clients store the returned `version` and pass it as `since` on the next poll.
+    """
+    async def build():
+        version = await get_data_version(db)
+        reset = 0 < since < oldest_syncable_version(version)
+        since_effective = 0 if reset else since
+
+        machines = await db.execute(
+            select(Machine, Client.name)
+            .options(*relation_loaders(MACHINE_FIELDS, []))
+            .outerjoin(Client, Machine.client_id == Client.id)
+            .where(Machine.data_version > since_effective)
+        )
+        interventions = await db.execute(
+            select(
+                Intervention.id, Intervention.machine_id, Intervention.type, Intervention.priority,
+                Intervention.status, Intervention.description, Intervention.date_created
+            ).where(Intervention.data_version > since_effective)
+        )
+
+        deleted = {"machines": [], "interventions": []}
+        if since_effective > 0:
+            result = await db.execute(
+                select(DeletedRow.entity, DeletedRow.entity_id).where(DeletedRow.data_version > since_effective)
+            )
+            for entity, entity_id in result.all():
+                deleted[f"{entity}s"].append(entity_id)
+
+        return {
+            "version": version,
+            "since": since,
+            "reset": reset,
+            "machines": [machine_to_dict(m, client_name) for m, client_name in machines.all()],
+            "interventions": [dict(row) for row in interventions.mappings()],
+            "deleted": deleted,
+        }
+    return await cached_json_response(request, db, build)
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+import hashlib
+import os
+import time
+from typing import Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.data_version import get_data_version
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Total body bytes held per worker (full /machines bodies run to about 1 MB each)
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+class LRUCache:
+    """
+    Size-bounded mapping evicting the least recently used entry, with hit/miss counters.
+    With `maxbytes`, entries also count the `size` given to set() against a byte budget;
+    an entry larger than the whole budget is not stored at all.
+    """
+
+    def __init__(self, maxsize: int, maxbytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, size: int = 0):
+        self.discard(key)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self._data[key] = value
+        self._sizes[key] = size
+        self.nbytes += size
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            self.discard(next(iter(self._data)))
+
+    def discard(self, key):
+        if self._data.pop(key, None) is not None:
+            self.nbytes -= self._sizes.pop(key)
+
+    def clear(self):
+        self._data.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """LRU cache whose entries also expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            # Counted as a miss: the caller has to reload
+            self.hits -= 1
+            self.misses += 1
+            self.discard(key)
+            return None
+        return value
+
+    def set(self, key, value, size: int = 0):
+        super().set(key, (time.monotonic() + self.ttl, value), size)
+
+    def invalidate(self, key):
+        self.discard(key)
+
+
+response_cache = LRUCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_BYTES)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return jsonable_encoder(obj)
+
+
+def render_json(payload) -> bytes:
+    """
+    Encodes plain dicts/lists with orjson (datetimes as ISO 8601, like FastAPI).
+    Endpoints building dicts directly skip Pydantic validation on the hot path;
+    the response_model on the route is kept for the OpenAPI schema only.
+    """
+    return orjson.dumps(payload, default=_default)
+
+
+async def cached_json_response(request: Request, db: AsyncSession, build, extra_key=None) -> Response:
+    """
+    Serves a read endpoint from the response cache.
+
+    Entries are keyed by route, query parameters and data version, so an ingestion or
+    regeneration naturally invalidates them. `build` is only awaited on a miss.
+    `extra_key` covers inputs that are not query parameters (e.g. today's date for relative filters).
+    The ETag is strong (derived from the exact body bytes); a matching If-None-Match gets a 304.
+    """
+    version = await get_data_version(db)
+    return await versioned_json_response(request, version, build, extra_key)
+
+
+async def versioned_json_response(request: Request, version: int, build, extra_key=None) -> Response:
+    """
+    cached_json_response for data held in memory with a known data version (the fleet snapshot):
+    no database round trip at all.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), version, extra_key)
+
+    entry = response_cache.get(key)
+    if entry is None:
+        body = render_json(await build())
+        etag = f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        entry = (body, etag)
+        response_cache.set(key, entry, len(body))
+
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,109 @@
+import datetime
+import os
+from collections import Counter, defaultdict
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import DataVersion, DeletedRow, Machine
+
+
+async def get_data_version(session: AsyncSession) -> int:
+    """Current data version. Changes only when ingestion or intervention generation commits."""
+    version = await session.scalar(select(DataVersion.version).where(DataVersion.id == 1))
+    return version or 0
+
+
+async def get_data_generation(session: AsyncSession) -> tuple:
+    """
+    (version, microsecond timestamp of its bump), or (0, 0) before the first bump. Unlike the
+    version alone, it identifies the data across a recreated database.
+    """
+    row = (await session.execute(
+        select(DataVersion.version, DataVersion.updated_at).where(DataVersion.id == 1)
+    )).first()
+    if row is None or row.updated_at is None:
+        return (row.version or 0) if row is not None else 0, 0
+    stamp = row.updated_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return row.version, int(round(stamp * 1_000_000))
+
+
+async def bump_data_version(session: AsyncSession) -> int:
+    """
+    Increments the data version inside the caller's transaction and returns the new value.
+    The row lock also serializes concurrent ingestions until the caller commits.
+    """
+    stmt = insert(DataVersion).values(id=1, version=1, updated_at=datetime.datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_=dict(version=DataVersion.version + 1, updated_at=stmt.excluded.updated_at)
+    ).returning(DataVersion.version)
+    result = await session.execute(stmt)
+    return result.scalar_one()
+
+
+# --- Delta sync stamps and tombstones ---
+
+SYNC_TOMBSTONE_RETENTION = int(os.getenv("SYNC_TOMBSTONE_RETENTION", "100")) # in data versions
+STAMP_CHUNK_SIZE = 1000
+
+
+def oldest_syncable_version(version: int) -> int:
+    """Clients syncing from before this version may have missed pruned tombstones and must reset."""
+    return max(version - SYNC_TOMBSTONE_RETENTION, 0)
+
+
+async def stamp_machines(session: AsyncSession, version: int, serials=None, ids=None) -> list:
+    """Marks machines (by serial number or id) as changed in `version`. Returns the stamped machine ids."""
+    column, values = (Machine.serial_number, list(serials)) if serials is not None else (Machine.id, list(ids or []))
+    stamped = []
+    for i in range(0, len(values), STAMP_CHUNK_SIZE):
+        result = await session.execute(
+            update(Machine)
+            .where(column.in_(values[i:i + STAMP_CHUNK_SIZE]))
+            .values(data_version=version)
+            .returning(Machine.id)
+            .execution_options(synchronize_session=False)
+        )
+        stamped.extend(result.scalars().all())
+    return stamped
+
+
+def upsert_if_changed(stmt, index_elements, columns):
+    """
+    ON CONFLICT DO UPDATE of `columns`, only when one of them differs: unchanged rows aren't
+    rewritten, and RETURNING yields the inserted and changed rows only (the ones to stamp).
+    """
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={c: stmt.excluded[c] for c in columns},
+        where=or_(*(stmt.table.c[c].is_distinct_from(stmt.excluded[c]) for c in columns)),
+    )
+
+
+async def changed_row_sets(session: AsyncSession, model, rows, columns) -> set:
+    """
+    Serial numbers whose `model` rows (a per-machine list, replaced as a whole by ingestion) differ
+    from `rows` on `columns`, order ignored. Only those need replacing and stamping.
+    """
+    new, old = defaultdict(Counter), defaultdict(Counter)
+    for row in rows:
+        new[row["serial_number"]][tuple(row[c] for c in columns)] += 1
+    serials = list(new)
+    for i in range(0, len(serials), STAMP_CHUNK_SIZE):
+        result = await session.execute(
+            select(model.serial_number, *(getattr(model, c) for c in columns))
+            .where(model.serial_number.in_(serials[i:i + STAMP_CHUNK_SIZE]))
+        )
+        for serial, *values in result.all():
+            old[serial][tuple(values)] += 1
+    return {serial for serial in serials if new[serial] != old.get(serial)}
+
+
+async def record_deletions(session: AsyncSession, entity: str, ids, version: int):
+    rows = [{"entity": entity, "entity_id": entity_id, "data_version": version} for entity_id in ids]
+    for i in range(0, len(rows), STAMP_CHUNK_SIZE):
+        await session.execute(insert(DeletedRow).values(rows[i:i + STAMP_CHUNK_SIZE]))
+
+
+async def prune_deletions(session: AsyncSession, version: int):
+    await session.execute(delete(DeletedRow).where(DeletedRow.data_version <= oldest_syncable_version(version)))
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+
+import asyncpg
+import orjson
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+FLEET_CHANNEL = "fleet_changes"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTENER_RETRY_SECONDS = 5
+
+
+async def notify(session: AsyncSession, channel: str, payload: str) -> None:
+    """Transactional NOTIFY: delivered to all workers (this one included) when the caller commits."""
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+
+async def notify_fleet_change(session: AsyncSession, version: int, job: str, machine_ids) -> None:
+    """
+    Queues a fleet-change notification inside the caller's transaction.
+    PostgreSQL delivers NOTIFY only on commit (and drops it on rollback), to every
+    worker listening on the channel, including this one.
+    """
+    machine_ids = sorted(machine_ids)
+    event = {"version": version, "job": job, "status": "completed", "count": len(machine_ids), "machine_ids": machine_ids}
+    payload = orjson.dumps(event)
+    if len(payload) > MAX_NOTIFY_BYTES:
+        # Too many ids to carry: clients fall back to GET /sync?since=
+        event["machine_ids"] = None
+        event["truncated"] = True
+        payload = orjson.dumps(event)
+    await notify(session, FLEET_CHANNEL, payload.decode())
+
+
+class FleetEventBroker:
+    """
+    Fans out fleet-change events within one worker: to SSE subscribers (one bounded queue each)
+    and to in-process hooks such as in-memory index rebuilds.
+    Hooks are coalesced: a burst of events triggers at most one extra run after the current one.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._hooks = []
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def on_change(self, hook) -> None:
+        """Registers `async def hook(event)` to run after every fleet change."""
+        self._hooks.append({"fn": hook, "task": None, "pending": None})
+
+    def publish(self, event: dict) -> None:
+        for queue in self._subscribers:
+            if queue.full():
+                # Slow consumer: drop its oldest event, the newest carries the latest version
+                queue.get_nowait()
+            queue.put_nowait(event)
+        for hook in self._hooks:
+            self._schedule(hook, event)
+
+    def _schedule(self, hook: dict, event: dict) -> None:
+        if hook["task"] is not None and not hook["task"].done():
+            hook["pending"] = event
+            return
+        hook["task"] = asyncio.create_task(self._run_hook(hook, event))
+
+    async def _run_hook(self, hook: dict, event: dict) -> None:
+        while event is not None:
+            try:
+                await hook["fn"](event)
+            except Exception as e:
+                logger.error(f"Fleet change hook {hook['fn'].__name__} failed: {e}")
+            event, hook["pending"] = hook["pending"], None
+
+
+broker = FleetEventBroker()
+
+_listener_task = None
+
+
+def _on_fleet_notify(payload: str) -> None:
+    try:
+        event = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        logger.warning(f"Ignoring malformed {FLEET_CHANNEL} payload")
+        return
+    broker.publish(event)
+
+
+# channel -> handler(payload). Register extra channels before start_listener().
+_channel_handlers = {FLEET_CHANNEL: _on_fleet_notify}
+
+
+def listen(channel: str, handler) -> None:
+    _channel_handlers[channel] = handler
+
+
+def _dispatch(connection, pid, channel, payload) -> None:
+    _channel_handlers[channel](payload)
+
+
+async def _listen_forever() -> None:
+    # Dedicated asyncpg connection outside the SQLAlchemy pool: LISTEN needs a session that stays open
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    reconnecting = False
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            closed = asyncio.Event()
+            conn.add_termination_listener(lambda c: closed.set())
+            for channel in _channel_handlers:
+                await conn.add_listener(channel, _dispatch)
+            logger.info(f"Listening on {', '.join(_channel_handlers)}")
+            if reconnecting:
+                # Notifications sent while disconnected are lost: tell everyone to resync
+                broker.publish({"version": None, "job": "resync", "status": "completed", "machine_ids": None})
+            await closed.wait()
+            logger.warning("LISTEN connection lost")
+        except Exception as e:
+            logger.error(f"LISTEN failed: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        reconnecting = True
+        await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+
+async def start_listener() -> None:
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_forever())
+
+
+async def stop_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
@@ -0,0 +1,448 @@
+import asyncio
+import datetime
+import functools
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Machine, Client, CVAF, Intervention, RemoteService, SuiviPS
+from services.data_version import get_data_generation
+from services.metrics import FLEET_SNAPSHOT_BYTES, FLEET_SNAPSHOT_BUILD_SECONDS, FLEET_SNAPSHOT_MAPPED_BYTES
+from services.snapshot_file import (
+    NUMERIC_COLUMNS, SnapshotFile, StringColumn, map_snapshot_file, prune_snapshot_files, snapshot_path,
+    write_snapshot_file,
+)
+from services.status_engine import STATUS_NAMES, StatusInputs
+
+try:
+    import fcntl
+except ImportError: # Windows: every worker builds its own snapshot
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Published snapshots shared by the workers of this host ("" = each worker builds its own copy)
+SNAPSHOT_DIR = os.getenv("FLEET_SNAPSHOT_DIR", "data/fleet_snapshot")
+# How long a worker waits for another process's build before building a private copy
+SNAPSHOT_WAIT_SECONDS = float(os.getenv("FLEET_SNAPSHOT_WAIT_SECONDS", "60"))
+# Older generations stay mapped by workers that haven't switched yet; unlinking them is safe
+SNAPSHOT_KEEP = 2
+
+NO_DATE = np.datetime64("NaT", "D")
+
+
+def intern_codes(values) -> tuple:
+    """(int32 codes, vocabulary): each distinct string stored once; None gets -1."""
+    vocabulary, codes, lookup = [], [], {}
+    for v in values:
+        if v is None:
+            codes.append(-1)
+            continue
+        code = lookup.get(v)
+        if code is None:
+            code = lookup[v] = len(vocabulary)
+            vocabulary.append(sys.intern(v))
+        codes.append(code)
+    return np.array(codes, dtype=np.int32), vocabulary
+
+
+class FleetSnapshot:
+    """
+    Columnar, immutable copy of what the machine list, map and client endpoints need, one row per
+    machine ordered by id: NumPy arrays for ids, coordinates, codes and flags, UTF-8 string
+    columns for serials and search text, interned vocabularies for models and client names.
+    Filtering is vectorized; statuses are computed once per build by the status engine.
+
+    Built from rows (from_rows) or mapped from a published snapshot file (from_file), in which
+    case the columns are read-only views over pages shared with the other workers.
+    Rebuilds swap the module-level instance, like the suggest index and the service forecast.
+    """
+
+    def __init__(self, columns: dict, strings: dict, data_version: Optional[int] = None, generation: int = 0,
+                 source: Optional[SnapshotFile] = None):
+        for name, _ in NUMERIC_COLUMNS:
+            setattr(self, name, columns[name])
+        self.serials = strings["serials"]
+        self.haystacks = strings["haystacks"]
+        # Small: decoded once per worker
+        self.models = strings["models"].to_list()
+        self.clients = strings["clients"].to_list()
+        self.data_version = data_version
+        self.generation = generation
+        self.source = source
+        self.built_at = None
+        self.build_seconds = None
+        self.nbytes = self._footprint()
+
+    @classmethod
+    def from_rows(cls, machines, cvaf=(), flash_update_ids=(), pending=(), ps_deadlines=(),
+                  data_version: Optional[int] = None, generation: int = 0) -> "FleetSnapshot":
+        # machines: (id, serial, model, latitude, longitude, status_code, psi_code, client_name), ordered by id
+        # cvaf: (machine_id, inspection_code, sos_code, end_date); pending: (machine_id, priority)
+        # ps_deadlines: (machine_id, earliest deadline of its Open PS campaigns)
+        n = len(machines)
+        columns = list(zip(*machines)) if n else [()] * 8
+        ids, serials, models, lats, lngs, status_codes, psi_codes, clients = columns
+        serials = [s or "" for s in serials]
+
+        c = {"ids": np.array(ids, dtype=np.int64)}
+        c["model_codes"], model_vocabulary = intern_codes(models)
+        c["client_codes"], client_vocabulary = intern_codes(clients)
+        c["lat"] = np.array(lats, dtype=np.float64) # None -> NaN
+        c["lng"] = np.array(lngs, dtype=np.float64)
+        encoded = [s.encode() for s in serials]
+        # Fixed-width bytes sort like the bytes themselves (serials hold no NUL)
+        c["serial_order"] = np.argsort(np.array(encoded, dtype=bytes), kind="stable").astype(np.int32) \
+            if n else np.empty(0, dtype=np.int32)
+        strings = {
+            "serials": StringColumn.from_strings(serials),
+            # ILIKE '%q%' over serial, model and client, as the SQL search did. The NUL terminator
+            # keeps a match inside one machine's text.
+            "haystacks": StringColumn.from_strings(
+                ("\x00".join(p.lower() for p in (serial, model, client) if p)
+                 for serial, model, client in zip(serials, models, clients)),
+                terminator=b"\x00",
+            ),
+            "models": StringColumn.from_strings(model_vocabulary),
+            "clients": StringColumn.from_strings(client_vocabulary),
+        }
+
+        def positions(machine_ids) -> tuple:
+            """(positions of the known machine ids, mask of the known ones)."""
+            machine_ids = np.asarray(machine_ids, dtype=np.int64)
+            if not n:
+                return machine_ids[:0], np.zeros(len(machine_ids), dtype=bool)
+            pos = np.minimum(np.searchsorted(c["ids"], machine_ids), n - 1)
+            known = c["ids"][pos] == machine_ids
+            return pos[known], known
+
+        c["has_cvaf"] = np.zeros(n, dtype=bool)
+        c["cva_end"] = np.full(n, NO_DATE)
+        if cvaf:
+            cvaf_ids, _, _, end_dates = zip(*cvaf)
+            pos, known = positions(cvaf_ids)
+            c["has_cvaf"][pos] = True
+            c["cva_end"][pos] = np.array(end_dates, dtype="datetime64[D]")[known] # None -> NaT
+
+        c["ps_deadline"] = np.full(n, NO_DATE)
+        if ps_deadlines:
+            ps_ids, deadlines = zip(*ps_deadlines)
+            pos, known = positions(ps_ids)
+            c["ps_deadline"][pos] = np.array(deadlines, dtype="datetime64[D]")[known]
+
+        inputs = StatusInputs.from_rows(
+            c["ids"], status_codes, psi_codes,
+            [(machine_id, inspection_code, sos_code) for machine_id, inspection_code, sos_code, _ in cvaf],
+            flash_update_ids, pending,
+        )
+        c["status_code"], c["psi_code"] = inputs.status_code, inputs.psi_code
+        c["cva_low"], c["flash_update"] = inputs.cva_low, inputs.flash_update
+        c["pending_high"], c["pending_medium"] = inputs.pending_high, inputs.pending_medium
+        c["status"], _ = inputs.evaluate()
+        return cls(c, strings, data_version=data_version, generation=generation)
+
+    @classmethod
+    def from_file(cls, path: str) -> "FleetSnapshot":
+        mapped = map_snapshot_file(path)
+        snapshot = cls(mapped.columns, mapped.strings, data_version=mapped.data_version,
+                       generation=mapped.generation, source=mapped)
+        snapshot.built_at = datetime.datetime.utcfromtimestamp(mapped.built_at)
+        snapshot.build_seconds = mapped.build_seconds
+        return snapshot
+
+    def write(self, path: str) -> int:
+        """Publishes the snapshot as a file in the shared layout; returns its size."""
+        built_at = (self.built_at or datetime.datetime.utcnow()).replace(tzinfo=datetime.timezone.utc).timestamp()
+        return write_snapshot_file(
+            path, len(self), self.data_version or 0, self.generation, built_at, self.build_seconds or 0.0,
+            {name: getattr(self, name) for name, _ in NUMERIC_COLUMNS},
+            {"serials": self.serials, "haystacks": self.haystacks,
+             "models": StringColumn.from_strings(self.models), "clients": StringColumn.from_strings(self.clients)},
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.data_version is not None
+
+    @property
+    def mapped_bytes(self) -> int:
+        return self.source.size if self.source is not None else 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _footprint(self) -> int:
+        """Memory private to this process (the vocabularies only, when mapped from a file)."""
+        vocabularies = sum(sys.getsizeof(s) for s in self.models) + sum(sys.getsizeof(s) for s in self.clients)
+        if self.source is not None:
+            return vocabularies
+        arrays = sum(getattr(self, name).nbytes for name, _ in NUMERIC_COLUMNS)
+        return arrays + self.serials.nbytes + self.haystacks.nbytes + vocabularies
+
+    # --- Queries ---
+
+    def filter(self, serial_number: Optional[str] = None, search: Optional[str] = None,
+               cva_ending_within_days: Optional[int] = None, ps_overdue: Optional[bool] = None,
+               machine_ids=None, statuses: Optional[List[str]] = None,
+               located: bool = False, today: Optional[datetime.date] = None) -> np.ndarray:
+        """Positions (in id order) of the machines matching every given filter."""
+        today = np.datetime64(today or datetime.date.today(), "D")
+        mask = np.ones(len(self), dtype=bool)
+        if serial_number:
+            only = np.zeros(len(self), dtype=bool)
+            only[self.serials.find_equal(serial_number, self.serial_order)] = True
+            mask &= only
+        if search:
+            q = search.lower()
+            found = np.zeros(len(self), dtype=bool)
+            if "\x00" not in q:
+                found[self.haystacks.find_rows(q.encode())] = True
+            mask &= found
+        if cva_ending_within_days is not None:
+            # NaT compares False: machines without a contract drop out
+            mask &= (self.cva_end >= today) & (self.cva_end <= today + cva_ending_within_days)
+        if ps_overdue is not None:
+            overdue = self.ps_deadline < today
+            mask &= overdue if ps_overdue else ~overdue
+        if machine_ids is not None:
+            mask &= np.isin(self.ids, np.asarray(list(machine_ids), dtype=np.int64))
+        if statuses:
+            mask &= np.isin(self.status, [STATUS_NAMES.index(s) for s in statuses])
+        if located:
+            mask &= ~np.isnan(self.lat) & ~np.isnan(self.lng)
+        return np.flatnonzero(mask)
+
+    def client_name(self, pos) -> Optional[str]:
+        code = self.client_codes[pos]
+        return self.clients[code] if code >= 0 else None
+
+    def machine_rows(self, positions, fields: List[str]) -> List[dict]:
+        """Same dicts as routers.machines.machine_to_dict for the snapshot's fields (no pendingInterventions)."""
+        rows = []
+        for pos in positions:
+            client = self.client_name(pos)
+            model_code = self.model_codes[pos]
+            out = {}
+            for f in fields:
+                if f == "id":
+                    out["id"] = int(self.ids[pos])
+                elif f == "serialNumber":
+                    out["serialNumber"] = self.serials[pos]
+                elif f == "model":
+                    out["model"] = self.models[model_code] if model_code >= 0 else None
+                elif f == "client":
+                    out["client"] = client if client is not None else "Unknown Client"
+                elif f == "location":
+                    lat, lng = self.lat[pos], self.lng[pos]
+                    out["location"] = {
+                        "lat": float(lat) if lat and not np.isnan(lat) else 0.0,
+                        "lng": float(lng) if lng and not np.isnan(lng) else 0.0,
+                        "address": client if client is not None else "",
+                    }
+                elif f == "status":
+                    out["status"] = STATUS_NAMES[self.status[pos]]
+            rows.append(out)
+        return rows
+
+    def map_points(self, positions) -> List[dict]:
+        return [
+            {
+                "id": int(self.ids[pos]),
+                "serialNumber": self.serials[pos],
+                "lat": float(self.lat[pos]),
+                "lng": float(self.lng[pos]),
+                "status": STATUS_NAMES[self.status[pos]],
+            }
+            for pos in positions
+        ]
+
+    def client_counts(self) -> List[dict]:
+        """Machines per client name (clients without machines left out), by name."""
+        assigned = self.client_codes[self.client_codes >= 0]
+        counts = np.bincount(assigned, minlength=len(self.clients))
+        rows = [{"name": name, "count": int(c)} for name, c in zip(self.clients, counts) if c]
+        return sorted(rows, key=lambda r: (r["name"].casefold(), r["name"]))
+
+    def stats(self) -> dict:
+        return {
+            "dataVersion": self.data_version,
+            "machines": len(self),
+            "models": len(self.models),
+            "clients": len(self.clients),
+            "builtAt": self.built_at,
+            "buildSeconds": self.build_seconds,
+            "bytes": self.nbytes,
+            "mappedFile": self.source.path if self.source is not None else None,
+            "mappedBytes": self.mapped_bytes,
+        }
+
+
+async def load_fleet_snapshot(session: AsyncSession) -> FleetSnapshot:
+    # One snapshot of the database for all the queries below. The isolation level only applies to
+    # a new transaction: end the one the caller's earlier queries (index rebuilds) began.
+    await session.rollback()
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version, generation = await get_data_generation(session)
+    machines = (await session.execute(
+        select(Machine.id, Machine.serial_number, Machine.model, Machine.latitude, Machine.longitude,
+               Machine.status_code, Machine.psi_code, Client.name)
+        .outerjoin(Client, Machine.client_id == Client.id)
+        .order_by(Machine.id)
+    )).all()
+    cvaf = (await session.execute(
+        select(Machine.id, CVAF.inspection_code, CVAF.sos_code, CVAF.end_date)
+        .join(CVAF, CVAF.serial_number == Machine.serial_number)
+    )).all()
+    flash_update_ids = (await session.execute(
+        select(Machine.id).join(RemoteService, RemoteService.serial_number == Machine.serial_number)
+        .where(RemoteService.flash_update == '1')
+    )).scalars().all()
+    pending = (await session.execute(
+        select(Intervention.machine_id, Intervention.priority)
+        .where(Intervention.status == 'PENDING')
+        .distinct()
+    )).all()
+    ps_deadlines = (await session.execute(
+        select(Machine.id, func.min(SuiviPS.deadline))
+        .join(SuiviPS, SuiviPS.serial_number == Machine.serial_number)
+        # Closed campaigns are done whatever their term date, as in intervention generation
+        .where(SuiviPS.status == 'Open')
+        .group_by(Machine.id)
+    )).all()
+    await session.rollback()
+    # Hundreds of ms of array building on a large fleet: off the event loop, which keeps serving
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+        FleetSnapshot.from_rows, machines, cvaf, flash_update_ids, pending, ps_deadlines,
+        data_version=version, generation=generation,
+    ))
+
+
+_snapshot = FleetSnapshot.from_rows([])
+_build_lock = asyncio.Lock()
+
+
+def get_fleet_snapshot() -> FleetSnapshot:
+    return _snapshot
+
+
+def reset_fleet_snapshot() -> None:
+    """Drops the snapshot, for scripts that recreate the database under a running app."""
+    global _snapshot
+    _snapshot = FleetSnapshot.from_rows([])
+
+
+def install_fleet_snapshot(snapshot: FleetSnapshot) -> FleetSnapshot:
+    """Swaps the snapshot in, unless a concurrent rebuild already installed a newer generation."""
+    global _snapshot
+    newer = (snapshot.generation, snapshot.data_version) >= (_snapshot.generation, _snapshot.data_version)
+    if not _snapshot.ready or newer:
+        _snapshot = snapshot
+    FLEET_SNAPSHOT_BYTES.set(_snapshot.nbytes)
+    FLEET_SNAPSHOT_MAPPED_BYTES.set(_snapshot.mapped_bytes)
+    return _snapshot
+
+
+async def build_fleet_snapshot(session: AsyncSession) -> FleetSnapshot:
+    start = time.perf_counter()
+    snapshot = await load_fleet_snapshot(session)
+    snapshot.build_seconds = round(time.perf_counter() - start, 3)
+    snapshot.built_at = datetime.datetime.utcnow()
+    FLEET_SNAPSHOT_BUILD_SECONDS.set(snapshot.build_seconds)
+    logger.info(
+        f"Fleet snapshot built: {len(snapshot)} machines (version {snapshot.data_version}) "
+        f"in {snapshot.build_seconds * 1000:.0f} ms, {snapshot.nbytes / 1e6:.1f} MB"
+    )
+    return snapshot
+
+
+def try_build_lock() -> Optional[int]:
+    """Descriptor holding the cross-process build lock, or None when another process holds it."""
+    fd = os.open(os.path.join(SNAPSHOT_DIR, "build.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def map_published(path: str) -> Optional[FleetSnapshot]:
+    try:
+        return FleetSnapshot.from_file(path)
+    except (FileNotFoundError, ValueError):
+        # Not published yet, pruned meanwhile, or written by another layout version
+        return None
+
+
+async def publish_fleet_snapshot(session: AsyncSession, generation: tuple) -> FleetSnapshot:
+    """
+    The published snapshot of the current data generation: built and published by whichever worker
+    takes the build lock while the others wait for the file. A lock holder that dies releases the
+    lock with its process; after SNAPSHOT_WAIT_SECONDS a waiting worker builds a private copy.
+    """
+    # File I/O (mapping, the fsynced write, pruning) runs in the default executor, off the event loop
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + SNAPSHOT_WAIT_SECONDS
+    while True:
+        snapshot = await loop.run_in_executor(None, map_published, snapshot_path(SNAPSHOT_DIR, *generation))
+        if snapshot is not None:
+            return snapshot
+        fd = try_build_lock()
+        if fd is not None:
+            try:
+                # The data may have moved on (or been published) while we waited for the lock
+                generation = await get_data_generation(session)
+                await session.rollback()
+                snapshot = await loop.run_in_executor(None, map_published, snapshot_path(SNAPSHOT_DIR, *generation))
+                if snapshot is not None:
+                    return snapshot
+                built = await build_fleet_snapshot(session)
+                path = snapshot_path(SNAPSHOT_DIR, built.data_version, built.generation)
+                await loop.run_in_executor(None, built.write, path)
+                await loop.run_in_executor(None, prune_snapshot_files, SNAPSHOT_DIR, SNAPSHOT_KEEP)
+                return await loop.run_in_executor(None, FleetSnapshot.from_file, path)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+        if time.monotonic() > deadline:
+            logger.warning(f"No fleet snapshot published for version {generation[0]} after "
+                           f"{SNAPSHOT_WAIT_SECONDS:.0f}s, building a private copy")
+            return await build_fleet_snapshot(session)
+        await asyncio.sleep(0.1)
+
+
+async def rebuild_fleet_snapshot(session: AsyncSession) -> FleetSnapshot:
+    """
+    Brings this worker's snapshot to the current data generation. With FLEET_SNAPSHOT_DIR set, one
+    process builds it and every worker maps the published file; otherwise each worker builds its own.
+    """
+    if not SNAPSHOT_DIR or fcntl is None:
+        return install_fleet_snapshot(await build_fleet_snapshot(session))
+
+    generation = await get_data_generation(session)
+    # Not idle in transaction while waiting for another worker's build
+    await session.rollback()
+    if generation[1] == 0:
+        # Never bumped (empty or directly seeded database): nothing identifies the data to share it
+        return install_fleet_snapshot(await build_fleet_snapshot(session))
+    if _snapshot.source is not None and (_snapshot.data_version, _snapshot.generation) == generation:
+        return _snapshot
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    return install_fleet_snapshot(await publish_fleet_snapshot(session, generation))
+
+
+async def current_fleet_snapshot() -> FleetSnapshot:
+    """The snapshot, built on first use when startup didn't (scripts driving the app without lifespan)."""
+    if not _snapshot.ready:
+        from database import AsyncSessionLocal
+
+        async with _build_lock:
+            if not _snapshot.ready:
+                async with AsyncSessionLocal() as session:
+                    await rebuild_fleet_snapshot(session)
+    return _snapshot
@@ -0,0 +1,170 @@
+import datetime
+import logging
+import os
+import time
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, func, cast, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import MeterReading
+from services.data_version import get_data_version
+from services.meter_history import readings_now
+
+logger = logging.getLogger(__name__)
+
+# Preventive maintenance every N service-meter hours (250 h for the standard PM cycle)
+SERVICE_INTERVAL_HOURS = float(os.getenv("SERVICE_INTERVAL_HOURS", "250"))
+# Readings older than this don't describe the current duty cycle
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", "180"))
+# Intervention generation plans services forecast within this horizon
+SERVICE_PLANNING_DAYS = int(os.getenv("SERVICE_PLANNING_DAYS", "14"))
+
+SECONDS_PER_DAY = 86400.0
+# Reading times are naive (as reported in the workbook): epoch arithmetic stays naive too, like EXTRACT(epoch)
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_epoch(dt: datetime.datetime) -> float:
+    return (dt - EPOCH).total_seconds()
+
+
+def from_epoch(seconds: float) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(seconds=float(seconds))
+
+
+class ServiceForecast:
+    """
+    When each machine crosses its next service-hour threshold, for the whole fleet at once.
+
+    Built from the meter history with one vectorized pass: readings are grouped by machine with
+    np.unique/np.bincount, the usage rate is the per-group least-squares slope of hours against
+    time, and the due date extrapolates the latest reading to the next multiple of the interval.
+    Only the readings since a machine's last meter decrease (a replaced or reset meter) count,
+    like usage_rates_query. Machines with fewer than two such readings, or no positive usage,
+    get no forecast.
+    `data_version` is the version the readings were loaded at (None for the empty placeholder).
+    """
+
+    def __init__(self, machine_ids, times, meters, interval: float = SERVICE_INTERVAL_HOURS,
+                 data_version: Optional[int] = None):
+        # times: epoch seconds
+        self.data_version = data_version
+        machine_ids = np.asarray(machine_ids, dtype=np.int64)
+        times = np.asarray(times, dtype=np.float64)
+        meters = np.asarray(meters, dtype=np.float64)
+        self.interval = interval
+
+        if machine_ids.size == 0:
+            self.machine_ids = np.empty(0, dtype=np.int64)
+            self.hours_per_day = self.latest_meter = self.next_service_hours = np.empty(0)
+            self.latest_time = self.due_time = np.empty(0)
+            return
+
+        # Sort by (machine, time) and keep each machine's readings from its last meter decrease on
+        order = np.lexsort((times, machine_ids))
+        machine_ids, times, meters = machine_ids[order], times[order], meters[order]
+        same = np.zeros(machine_ids.size, dtype=bool)
+        same[1:] = machine_ids[1:] == machine_ids[:-1]
+        starts = ~same
+        starts[1:] |= same[1:] & (meters[1:] < meters[:-1])
+        positions = np.arange(machine_ids.size)
+        segment_start = np.maximum.accumulate(np.where(starts, positions, 0))
+        ends = np.flatnonzero(np.append(~same[1:], True))
+        ids, group = np.unique(machine_ids, return_inverse=True)
+        keep = positions >= segment_start[ends][group]
+        machine_ids, times, meters, group = machine_ids[keep], times[keep], meters[keep], group[keep]
+        n = np.bincount(group).astype(np.float64)
+
+        # Per-group regression on days since the global start (keeps the sums well conditioned)
+        x = (times - times.min()) / SECONDS_PER_DAY
+        y = meters
+        sx, sy = np.bincount(group, x), np.bincount(group, y)
+        sxx, sxy = np.bincount(group, x * x), np.bincount(group, x * y)
+        denom = n * sxx - sx * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(denom > 0, (n * sxy - sx * sy) / denom, np.nan)
+
+        # Latest reading per machine: rows are still sorted by (machine, time), take each group's last
+        last = np.cumsum(np.bincount(group)) - 1
+        latest_time, latest_meter = times[last], meters[last]
+
+        next_threshold = (np.floor(latest_meter / interval) + 1) * interval
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_to_threshold = np.where(slope > 0, (next_threshold - latest_meter) / slope, np.nan)
+
+        self.machine_ids = ids
+        self.hours_per_day = slope
+        self.latest_time = latest_time
+        self.latest_meter = latest_meter
+        self.next_service_hours = next_threshold
+        self.due_time = latest_time + days_to_threshold * SECONDS_PER_DAY # NaN when unknown
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.due_time)))
+
+    def due_before(self, deadline: datetime.datetime) -> np.ndarray:
+        """Positions of machines forecast to reach their next service before `deadline` (overdue included)."""
+        with np.errstate(invalid="ignore"):
+            return np.flatnonzero(self.due_time <= to_epoch(deadline))
+
+    def due_within(self, days: int, now: Optional[datetime.datetime] = None) -> np.ndarray:
+        now = now or readings_now()
+        return self.due_before(now + datetime.timedelta(days=days))
+
+    def machine_ids_due_within(self, days: int) -> list:
+        return self.machine_ids[self.due_within(days)].tolist()
+
+    def rows(self, positions) -> list:
+        """Plain dicts for the given positions, soonest first."""
+        positions = np.asarray(positions)
+        positions = positions[np.argsort(self.due_time[positions], kind="stable")]
+        now = to_epoch(readings_now())
+        return [
+            {
+                "machine_id": int(self.machine_ids[p]),
+                "latest_meter": float(self.latest_meter[p]),
+                "latest_reading": from_epoch(self.latest_time[p]),
+                "hours_per_day": float(self.hours_per_day[p]),
+                "next_service_hours": float(self.next_service_hours[p]),
+                "due_date": from_epoch(self.due_time[p]).date(),
+                "days_until_due": round(float(self.due_time[p] - now) / SECONDS_PER_DAY, 1),
+            }
+            for p in positions
+        ]
+
+
+async def compute_service_forecast(session: AsyncSession) -> ServiceForecast:
+    # Read first: a concurrent ingestion can only make the readings newer than the version, never older
+    data_version = await get_data_version(session)
+    since = readings_now() - datetime.timedelta(days=FORECAST_WINDOW_DAYS)
+    result = await session.execute(
+        select(
+            MeterReading.machine_id,
+            # EXTRACT returns numeric (Decimal) on PostgreSQL 14+
+            cast(func.extract("epoch", MeterReading.reading_time), Float),
+            MeterReading.service_meter,
+        ).where(MeterReading.reading_time >= since)
+    )
+    rows = result.all()
+    if not rows:
+        return ServiceForecast([], [], [], data_version=data_version)
+    machine_ids, times, meters = zip(*rows)
+    return ServiceForecast(machine_ids, times, meters, data_version=data_version)
+
+
+_forecast = ServiceForecast([], [], [])
+
+
+def get_service_forecast() -> ServiceForecast:
+    return _forecast
+
+
+async def rebuild_service_forecast(session: AsyncSession) -> ServiceForecast:
+    """Recomputes the fleet forecast and swaps the module-level instance (readers never see a partial one)."""
+    global _forecast
+    start = time.perf_counter()
+    forecast = await compute_service_forecast(session)
+    _forecast = forecast
+    logger.info(f"Service forecast rebuilt: {len(forecast)} machines in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return forecast
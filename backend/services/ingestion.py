@@ -6,11 +6,42 @@ from sqlalchemy import select, update, delete
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import Machine, Client, RemoteService, CVAF, SuiviPS, InspectionRate
+from services.data_version import bump_data_version, stamp_machines, upsert_if_changed, changed_row_sets
+from services.events import notify_fleet_change
+from services.rollups import refresh_rollups
+from services.status_codes import machine_status_code, psi_code, score_code
+from services.meter_history import record_meter_readings, ensure_partitions
+from services.metrics import StageTimer, INGESTION_STAGE_SECONDS, INGESTION_SECONDS
+
+# Excel stores dates as serial day counts from 1899-12-30
+EXCEL_EPOCH = "1899-12-30"
+LAST_REPORTED_COLUMN = "Heure du dernier signalement du dernier compteur d'entretien connu"
+
+def excel_dates(series: pd.Series, as_date: bool = True) -> pd.Series:
+    """
+    Converts a whole column at once: datetimes, Excel serial numbers and date strings (day first).
+    Returns python dates (or timestamps when as_date=False), with None for empty or unparseable cells.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series
+    else:
+        numeric = pd.to_numeric(series, errors="coerce")
+        from_serial = pd.to_datetime(numeric, unit="D", origin=EXCEL_EPOCH, errors="coerce")
+        from_text = pd.to_datetime(series.where(numeric.isna()), errors="coerce", dayfirst=True, format="mixed")
+        parsed = from_serial.fillna(from_text)
+    values = parsed.dt.date if as_date else parsed.astype(object)
+    return pd.Series(values, index=series.index, dtype=object).where(parsed.notna(), None)
+
+def convert_date_columns(df: pd.DataFrame, columns, as_date: bool = True) -> None:
+    for col in columns:
+        if col in df.columns:
+            df[col] = excel_dates(df[col], as_date)
 
 async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
+    stages = StageTimer(INGESTION_STAGE_SECONDS, INGESTION_SECONDS)
     print("Reading Excel file...")
     try:
         df = pd.read_excel(file_path)
@@ -19,6 +50,19 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
 
     row_count = len(df)
     print(f"Found {row_count} rows.")
+    convert_date_columns(df, [LAST_REPORTED_COLUMN], as_date=False)
+    stages.mark("read_excel")
+
+    # Meter reading partitions first, each in its own short transaction (not under this one)
+    if LAST_REPORTED_COLUMN in df.columns:
+        await ensure_partitions([t for t in df[LAST_REPORTED_COLUMN] if t is not None])
+    stages.mark("partitions")
+
+    # Machines whose data this file actually changes are stamped with the new data version (delta
+    # sync): upserts only rewrite differing rows, and per-machine row sets are compared first.
+    # Bumping first also holds the data_version row lock, serializing concurrent ingestions.
+    data_version = await bump_data_version(session)
+    touched_serials = set()
 
     # Create Clients first (or update if exists)
     clients_dict = {} # external_id -> Client object
@@ -49,18 +93,23 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
     if client_inserts:
         print(f"Inserting {len(client_inserts)} clients...")
         stmt = insert(Client).values(client_inserts)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['external_id'],
-            set_=dict(name=stmt.excluded.name, account_number=stmt.excluded.account_number)
-        )
-        await session.execute(stmt)
+        stmt = upsert_if_changed(stmt, ['external_id'], ['name', 'account_number']).returning(Client.id)
+        changed_client_ids = (await session.execute(stmt)).scalars().all()
         clients_processed = len(client_inserts)
+        # Their machines show the client name
+        if changed_client_ids:
+            result = await session.execute(
+                select(Machine.serial_number).where(Machine.client_id.in_(changed_client_ids))
+            )
+            touched_serials.update(result.scalars().all())
     
     # Fetch all clients back to get their internal IDs
     result = await session.execute(select(Client))
     db_clients = result.scalars().all()
     client_map = {c.external_id: c.id for c in db_clients}
 
+    stages.mark("clients")
+
     # Prepare Machines
     machine_inserts = []
     print("Processing machines...")
@@ -112,7 +161,7 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             "model": clean_str(row.get('Modèle')),
             "family": clean_str(row.get('Famille de produits')),
             "service_meter": row.get("Compteur d'entretien (Heures)"),
-            "last_reported_time": row.get("Heure du dernier signalement du dernier compteur d'entretien connu"), 
+            "last_reported_time": row.get(LAST_REPORTED_COLUMN),
             "status": clean_str(row.get("Dernier statut matériel remonté")),
             "latitude": lat if valid_coords else None,
             "longitude": lon if valid_coords else None,
@@ -124,6 +173,7 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
         for k, v in machine_data.items():
             if isinstance(v, float) and math.isnan(v):
                 machine_data[k] = None
+        machine_data["status_code"] = machine_status_code(machine_data["status"])
         
         machine_inserts.append(machine_data)
 
@@ -134,26 +184,36 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
              for i in range(0, len(machine_inserts), chunk_size):
                  chunk = machine_inserts[i:i+chunk_size]
                  stmt = insert(Machine).values(chunk)
-                 stmt = stmt.on_conflict_do_update(
-                    index_elements=['serial_number'],
-                    set_=dict(
-                        service_meter=stmt.excluded.service_meter,
-                        status=stmt.excluded.status,
-                        latitude=stmt.excluded.latitude,
-                        longitude=stmt.excluded.longitude,
-                        #location=stmt.excluded.location,
-                        client_id=stmt.excluded.client_id
-                    )
-                 )
-                 await session.execute(stmt)
+                 stmt = upsert_if_changed(stmt, ['serial_number'], [
+                     'service_meter', 'last_reported_time', 'status', 'status_code',
+                     'latitude', 'longitude', 'client_id',
+                 ]).returning(Machine.serial_number)
+                 touched_serials.update((await session.execute(stmt)).scalars().all())
                  print(f"Processed chunk {i} to {i+len(chunk)}")
              machines_processed = len(machine_inserts)
 
+    stages.mark("machines")
+
+    # Append this file's meter readings to the history (the machine row only keeps the latest)
+    meter_readings_recorded = 0
+    metered = [m for m in machine_inserts if m["service_meter"] is not None and m["last_reported_time"] is not None]
+    if metered:
+        result = await session.execute(select(Machine.serial_number, Machine.id))
+        serial_to_id = {row[0]: row[1] for row in result.all()}
+        meter_readings_recorded = await record_meter_readings(
+            session,
+            [(serial_to_id[m["serial_number"]], m["last_reported_time"], m["service_meter"]) for m in metered],
+            data_version,
+        )
+        print(f"Recorded {meter_readings_recorded} meter readings.")
+    stages.mark("meter_readings")
+
     # Process CVAF sheet if it exists
     cvaf_processed = 0
     try:
         cvaf_df = pd.read_excel(file_path, sheet_name='CVAF')
         print(f"Found CVAF sheet with {len(cvaf_df)} rows.")
+        convert_date_columns(cvaf_df, ['Start Date', 'End Date'])
 
         cvaf_inserts = []
         for _, row in cvaf_df.iterrows():
@@ -169,8 +229,8 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             
             cvaf_data = {
                 "serial_number": serial,
-                "start_date": str(row.get('Start Date')) if not pd.isna(row.get('Start Date')) else None,
-                "end_date": str(row.get('End Date')) if not pd.isna(row.get('End Date')) else None,
+                "start_date": row.get('Start Date'),
+                "end_date": row.get('End Date'),
                 "cva_type": row.get('Cva Type'),
                 "country_code": row.get('Country Code'),
                 "product_vertical": row.get('Product Vertical'),
@@ -186,6 +246,8 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             for k, v in cvaf_data.items():
                 if isinstance(v, float) and math.isnan(v):
                     cvaf_data[k] = None
+            cvaf_data["inspection_code"] = score_code(cvaf_data["inspection_score"])
+            cvaf_data["sos_code"] = score_code(cvaf_data["sos_score"])
             
             cvaf_inserts.append(cvaf_data)
         
@@ -207,29 +269,19 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
                  for i in range(0, len(valid_cvaf_inserts), chunk_size):
                      chunk = valid_cvaf_inserts[i:i+chunk_size]
                      stmt = insert(CVAF).values(chunk)
-                     stmt = stmt.on_conflict_do_update(
-                        index_elements=['serial_number'],
-                        set_=dict(
-                            start_date=stmt.excluded.start_date,
-                            end_date=stmt.excluded.end_date,
-                            cva_type=stmt.excluded.cva_type,
-                            country_code=stmt.excluded.country_code,
-                            product_vertical=stmt.excluded.product_vertical,
-                            dlr_cust_nm=stmt.excluded.dlr_cust_nm,
-                            current_asset_age=stmt.excluded.current_asset_age,
-                            asset_age_group=stmt.excluded.asset_age_group,
-                            inspection_score=stmt.excluded.inspection_score,
-                            connectivity_score=stmt.excluded.connectivity_score,
-                            sos_score=stmt.excluded.sos_score
-                        )
-                     )
-                     await session.execute(stmt)
+                     stmt = upsert_if_changed(stmt, ['serial_number'], [
+                         'start_date', 'end_date', 'cva_type', 'country_code', 'product_vertical',
+                         'dlr_cust_nm', 'current_asset_age', 'asset_age_group', 'inspection_score',
+                         'connectivity_score', 'sos_score', 'inspection_code', 'sos_code',
+                     ]).returning(CVAF.serial_number)
+                     touched_serials.update((await session.execute(stmt)).scalars().all())
                  cvaf_processed = len(valid_cvaf_inserts)
 
     except ValueError:
         print("CVAF sheet not found.")
     except Exception as e:
         print(f"Error processing CVAF: {e}")
+    stages.mark("cvaf")
     
     # Process PSSR_Client (Metadata for Client Only)
     pssr_processed = 0
@@ -272,12 +324,14 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
         print("PSSR_Client sheet not found.")
     except Exception as e:
         print(f"Error processing PSSR: {e}")
+    stages.mark("pssr")
 
     # Process Suivi_PS
     suivi_ps_processed = 0
     try:
         suivi_df = pd.read_excel(file_path, sheet_name='Suivi_PS')
         print(f"Found Suivi_PS sheet with {len(suivi_df)} rows.")
+        convert_date_columns(suivi_df, ['Letter Date', 'Term Date'])
         
         suivi_inserts = []
         serials_in_sheet = set()
@@ -295,14 +349,14 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
 
             suivi_data = {
                 "serial_number": serial,
-                "date": str(row.get('Letter Date')) if not pd.isna(row.get('Letter Date')) else None,
+                "date": row.get('Letter Date'),
                 "client": row.get('Client'),
                 "reference_number": str(row.get('Program Number')) if not pd.isna(row.get('Program Number')) else None,
                 "ps_type": row.get('Service Letter Type'),
                 "status": row.get('Status'),
                 "description": row.get('Description'),
                 "action_required": None, # Not in file
-                "deadline": str(row.get('Term Date')) if not pd.isna(row.get('Term Date')) else None
+                "deadline": row.get('Term Date')
             }
              # Clean NaNs
             for k, v in suivi_data.items():
@@ -311,20 +365,24 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             suivi_inserts.append(suivi_data)
 
         if suivi_inserts:
-             print(f"Deleting existing SuiviPS for {len(serials_in_sheet)} machines...")
-             await session.execute(delete(SuiviPS).where(SuiviPS.serial_number.in_(serials_in_sheet)))
-             
-             print(f"Inserting {len(suivi_inserts)} SuiviPS records...")
+             # Only the machines whose campaigns differ from the stored ones are replaced
+             changed = await changed_row_sets(session, SuiviPS, suivi_inserts, [c for c in suivi_inserts[0] if c != "serial_number"])
+             print(f"Replacing SuiviPS for {len(changed)} of {len(serials_in_sheet)} machines...")
+             if changed:
+                 await session.execute(delete(SuiviPS).where(SuiviPS.serial_number.in_(changed)))
+             changed_inserts = [r for r in suivi_inserts if r["serial_number"] in changed]
              chunk_size = 1000
-             for i in range(0, len(suivi_inserts), chunk_size):
-                 chunk = suivi_inserts[i:i+chunk_size]
+             for i in range(0, len(changed_inserts), chunk_size):
+                 chunk = changed_inserts[i:i+chunk_size]
                  await session.execute(insert(SuiviPS).values(chunk))
              suivi_ps_processed = len(suivi_inserts)
+             touched_serials.update(changed)
              
     except ValueError:
             print("Suivi_PS sheet not found.")
     except Exception as e:
             print(f"Error processing Suivi_PS: {e}")
+    stages.mark("suivi_ps")
 
     # Process Inspection Rate
     inspection_processed = 0
@@ -333,6 +391,7 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
         
         insp_df = pd.read_excel(file_path, sheet_name='Inspection Rate')
         print(f"Found Inspection Rate sheet with {len(insp_df)} rows.")
+        convert_date_columns(insp_df, ['Date Facture (Lignes)', 'Last Inspect'])
         
         # Refresh machine mapping to handle newly inserted machines
         result = await session.execute(select(Machine.serial_number, Machine.id))
@@ -355,8 +414,8 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             serials_in_sheet.add(serial)
             
             # Extract data
-            date_facture = str(row.get('Date Facture (Lignes)')) if not pd.isna(row.get('Date Facture (Lignes)')) else None
-            last_inspect = str(row.get('Last Inspect')) if not pd.isna(row.get('Last Inspect')) else None
+            date_facture = row.get('Date Facture (Lignes)')
+            last_inspect = row.get('Last Inspect')
             is_inspected = row.get('Is Inspected')
             
             # Prepare InspectionRate insertion payload
@@ -381,31 +440,50 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
             insp_inserts.append(insp_data)
             
             # Prepare Machine update payload
+            psi_status = str(is_inspected) if not pd.isna(is_inspected) else None
             machine_updates.append({
                 "id": serial_to_id[serial],
                 "last_visit": last_inspect,
-                "psi_status": str(is_inspected) if not pd.isna(is_inspected) else None
+                "psi_status": psi_status,
+                "psi_code": psi_code(psi_status)
             })
 
         if insp_inserts:
-             print(f"Deleting existing InspectionRate for {len(serials_in_sheet)} machines...")
-             await session.execute(delete(InspectionRate).where(InspectionRate.serial_number.in_(serials_in_sheet)))
-             
-             print(f"Inserting {len(insp_inserts)} InspectionRate records...")
+             # Only the machines whose inspection rows differ from the stored ones are replaced
+             changed = await changed_row_sets(session, InspectionRate, insp_inserts, [c for c in insp_inserts[0] if c != "serial_number"])
+             print(f"Replacing InspectionRate for {len(changed)} of {len(serials_in_sheet)} machines...")
+             if changed:
+                 await session.execute(delete(InspectionRate).where(InspectionRate.serial_number.in_(changed)))
+             changed_inserts = [r for r in insp_inserts if r["serial_number"] in changed]
              chunk_size = 1000
-             for i in range(0, len(insp_inserts), chunk_size):
-                 chunk = insp_inserts[i:i+chunk_size]
+             for i in range(0, len(changed_inserts), chunk_size):
+                 chunk = changed_inserts[i:i+chunk_size]
                  await session.execute(insert(InspectionRate).values(chunk))
              inspection_processed = len(insp_inserts)
+             touched_serials.update(changed)
 
         if machine_updates:
-            print(f"Updating {len(machine_updates)} machines with Last Inspect info...")
-            await session.execute(update(Machine), machine_updates)
+            # The last row of a machine wins, as with the bulk update; skip the unchanged ones
+            latest = {u["id"]: u for u in machine_updates}
+            result = await session.execute(
+                select(Machine.id, Machine.serial_number, Machine.last_visit, Machine.psi_status, Machine.psi_code)
+                .where(Machine.id.in_(list(latest)))
+            )
+            changed_updates = []
+            for machine_id, serial, last_visit, psi_status, code in result.all():
+                u = latest[machine_id]
+                if (u["last_visit"], u["psi_status"], u["psi_code"]) != (last_visit, psi_status, code):
+                    changed_updates.append(u)
+                    touched_serials.add(serial)
+            print(f"Updating {len(changed_updates)} machines with Last Inspect info...")
+            if changed_updates:
+                await session.execute(update(Machine), changed_updates)
 
     except ValueError:
             print("Inspection Rate sheet not found.")
     except Exception as e:
             print(f"Error processing Inspection Rate: {e}")
+    stages.mark("inspection_rate")
 
     # Process Remote Service
     remote_service_processed = 0
@@ -476,32 +554,38 @@ async def ingest_programmes_data(file_path: str, session: AsyncSession) -> dict:
              if new_machine_stubs:
                  print(f"Adding {len(new_machine_stubs)} machine stubs from Remote Service...")
                  stmt_machines = insert(Machine).values(new_machine_stubs)
-                 stmt_machines = stmt_machines.on_conflict_do_nothing(index_elements=['serial_number'])
-                 await session.execute(stmt_machines)
+                 stmt_machines = stmt_machines.on_conflict_do_nothing(index_elements=['serial_number']).returning(Machine.serial_number)
+                 touched_serials.update((await session.execute(stmt_machines)).scalars().all())
                  await session.flush() # Ensure machines exist before RemoteService refers to them
 
              # 4. Bulk Insert/Update Remote Service Records
              if remote_inserts:
                  print(f"Upserting RemoteService for {len(remote_inserts)} machines...")
                  stmt = insert(RemoteService).values(remote_inserts)
-                 stmt = stmt.on_conflict_do_update(
-                     index_elements=['serial_number'],
-                     set_=dict(
-                         flash_update=stmt.excluded.flash_update
-                     )
-                 )
-                 await session.execute(stmt)
+                 stmt = upsert_if_changed(stmt, ['serial_number'], ['flash_update']).returning(RemoteService.serial_number)
+                 touched_serials.update((await session.execute(stmt)).scalars().all())
                  remote_service_processed = len(remote_inserts)
     else:
         print("No Remote Service sheet or data detected.")
+    stages.mark("remote_service")
 
+    print(f"Stamping {len(touched_serials)} machines with data version {data_version}...")
+    changed_machine_ids = await stamp_machines(session, data_version, serials=touched_serials)
+    await notify_fleet_change(session, data_version, "ingestion", changed_machine_ids)
+    stages.mark("stamp")
+    await refresh_rollups(session, data_version)
+    stages.mark("rollups")
+    total = stages.finish()
+    print("Ingestion stages: " + ", ".join(f"{k} {v:.2f}s" for k, v in stages.durations.items()) + f" (total {total:.2f}s)")
 
     return {
         "clients": clients_processed, 
         "machines": machines_processed, 
+        "meter_readings": meter_readings_recorded,
         "cvaf": cvaf_processed,
         "pssr": pssr_processed,
         "suivi_ps": suivi_ps_processed,
         "inspection_rate": inspection_processed,
-        "remote_service": remote_service_processed
+        "remote_service": remote_service_processed,
+        "stage_seconds": {k: round(v, 3) for k, v in stages.durations.items()},
     }
@@ -1,7 +1,16 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, or_, and_
-from models import Machine, Intervention, Client, CVAF, SuiviPS
+from collections import defaultdict
+from sqlalchemy import select, delete, or_
+from models import Machine, Intervention, CVAF, SuiviPS
+from services.data_version import bump_data_version, stamp_machines, record_deletions, prune_deletions
+from services.events import notify_fleet_change
+from services.rollups import refresh_rollups
+from services.status_codes import SCORE_MISSING, PSI_NOT_INSPECTED
+from services.forecast import compute_service_forecast, SERVICE_PLANNING_DAYS
+from services.meter_history import readings_now
+from services.metrics import StageTimer, GENERATION_STAGE_SECONDS, GENERATION_SECONDS
+import datetime
 import logging
 
 # Configure logging
@@ -13,28 +22,20 @@ async def generate_interventions(session: AsyncSession):
     Analyzes Machine data (CVAF, Inspection Rate, Suivi_PS) and generates Interventions.
     """
     logger.info("Starting Intervention Generation...")
+    stages = StageTimer(GENERATION_STAGE_SECONDS, GENERATION_SECONDS)
+    data_version = await bump_data_version(session)
     
-    # 1. Clear existing PENDING interventions to regenerate fresh ones (optional strategy)
-    # OR we can just add new ones. For now, let's clear PENDING to avoid duplicates/stale data.
-    logger.info("Clearing existing PENDING interventions...")
-    await session.execute(delete(Intervention).where(Intervention.status == 'PENDING'))
-    
-    intervention_count = 0
-    
-    # Fetch all machines with their related data
-    # We might need to optimize this with joinedload if the dataset is huge, 
-    # but for 10k machines it might be okay or we can process in chunks.
-    # For simplicity/speed in MVP, let's query specific conditions directly in SQL.
+    # The PENDING interventions are regenerated from scratch, then diffed against the stored ones:
+    # identical ones are kept (same id and data version, nothing for /sync to re-send), stale ones
+    # deleted and new ones inserted.
 
-    # Better approach: Construct payloads and bulk insert.
-    
     # 1. CVAF
-    stmt_cvaf = select(Machine.id, CVAF.inspection_score, CVAF.sos_score).join(
+    stmt_cvaf = select(Machine.id, CVAF.inspection_code, CVAF.sos_code).join(
         CVAF, Machine.serial_number == CVAF.serial_number
     ).where(
         or_(
-            CVAF.inspection_score == '0/1',
-            CVAF.sos_score == '0/1'
+            CVAF.inspection_code == SCORE_MISSING,
+            CVAF.sos_code == SCORE_MISSING
         )
     )
     result_cvaf = await session.execute(stmt_cvaf)
@@ -42,11 +43,11 @@ async def generate_interventions(session: AsyncSession):
     interventions_to_add = []
     
     for row in result_cvaf.all():
-        mach_id, insp_score, sos_score = row
+        mach_id, insp_code, sos_code = row
         reasons = []
-        if insp_score == '0/1':
+        if insp_code == SCORE_MISSING:
             reasons.append("Inspection manquante")
-        if sos_score == '0/1':
+        if sos_code == SCORE_MISSING:
             reasons.append("Analyse SOS manquante")
             
         interventions_to_add.append(Intervention(
@@ -57,10 +58,12 @@ async def generate_interventions(session: AsyncSession):
             description=f"Action requise : {', '.join(reasons)}"
         ))
 
+    stages.mark("cvaf")
+
     # 2. Inspection Rate (High Priority)
     # Trigger: psi_status == 'Non Inspecté'
     logger.info("Analyzing Inspection Rate rules...")
-    stmt_insp = select(Machine.id).where(Machine.psi_status == 'Non Inspecté')
+    stmt_insp = select(Machine.id).where(Machine.psi_code == PSI_NOT_INSPECTED)
     result_insp = await session.execute(stmt_insp)
     
     for row in result_insp.all():
@@ -72,15 +75,13 @@ async def generate_interventions(session: AsyncSession):
             description="Machine non inspectée (Programme Inspection Rate)"
         ))
 
+    stages.mark("inspection")
+
     # 3. Suivi PS (Low Priority / Opportunistic)
     # Trigger: Entry in SuiviPS table
     logger.info("Analyzing Suivi PS rules...")
-    from models import SuiviPS
-    
-    # Get machines that have at least one SuiviPS record
-    # distinct machines
-    # Get machines that have at least one SuiviPS record with Status 'Open'
-    # distinct machines
+
+    # Machines with at least one open SuiviPS record
     stmt_suivi = select(
         Machine.id, 
         SuiviPS.reference_number, 
@@ -120,12 +121,68 @@ async def generate_interventions(session: AsyncSession):
             description=formatted_desc
         ))
 
-    # Bulk Insert
-    if interventions_to_add:
-        logger.info(f"Generated {len(interventions_to_add)} interventions.")
-        session.add_all(interventions_to_add)
-        await session.commit()
-    else:
-        logger.info("No interventions generated.")
-        
+    stages.mark("suivi_ps")
+
+    # 4. Service due (Medium Priority when overdue)
+    # Trigger: next service-hour threshold forecast within SERVICE_PLANNING_DAYS
+    logger.info("Analyzing service-due forecast...")
+    forecast = await compute_service_forecast(session)
+    now = readings_now()
+    for row in forecast.rows(forecast.due_within(SERVICE_PLANNING_DAYS, now)):
+        overdue = row["due_date"] <= now.date()
+        interventions_to_add.append(Intervention(
+            machine_id=row["machine_id"],
+            type='SERVICE',
+            priority='MEDIUM' if overdue else 'LOW',
+            status='PENDING',
+            description=(
+                f"Entretien {row['next_service_hours']:.0f} h prévu le {row['due_date']:%d/%m/%Y} "
+                f"({row['hours_per_day']:.1f} h/jour)"
+            )
+        ))
+    stages.mark("service")
+
+    result_pending = await session.execute(
+        select(Intervention.id, Intervention.machine_id, Intervention.type, Intervention.priority,
+               Intervention.description).where(Intervention.status == 'PENDING')
+    )
+    # Stored ids per identical intervention; each generated one consumes a match
+    stored = defaultdict(list)
+    for intervention_id, *key in result_pending.all():
+        stored[tuple(key)].append(intervention_id)
+    new_interventions = []
+    for intervention in interventions_to_add:
+        matches = stored.get((intervention.machine_id, intervention.type, intervention.priority, intervention.description))
+        if matches:
+            matches.pop()
+        else:
+            intervention.data_version = data_version
+            new_interventions.append(intervention)
+    stale = [(intervention_id, key[0]) for key, ids in stored.items() for intervention_id in ids]
+    stages.mark("diff")
+
+    logger.info(f"Generated {len(interventions_to_add)} interventions: {len(new_interventions)} new, "
+                f"{len(stale)} stale removed, {len(interventions_to_add) - len(new_interventions)} unchanged.")
+    stale_ids = [intervention_id for intervention_id, _ in stale]
+    for i in range(0, len(stale_ids), 1000):
+        await session.execute(delete(Intervention).where(Intervention.id.in_(stale_ids[i:i + 1000])))
+    # Tombstones for /sync
+    await record_deletions(session, 'intervention', stale_ids, data_version)
+    await prune_deletions(session, data_version)
+    session.add_all(new_interventions)
+    await session.flush()
+
+    # Machines whose pending interventions changed are re-sent by /sync
+    changed_machine_ids = {machine_id for _, machine_id in stale} | {i.machine_id for i in new_interventions}
+    await stamp_machines(session, data_version, ids=changed_machine_ids)
+    await notify_fleet_change(session, data_version, "interventions", changed_machine_ids)
+    stages.mark("insert")
+    await refresh_rollups(session, data_version)
+    stages.mark("rollups")
+    # Always commit: even a run that generates nothing may have removed stale interventions, and
+    # it has bumped the data version and refreshed the rollups
+    await session.commit()
+    stages.mark("commit")
+    stages.finish()
+
     return len(interventions_to_add)
@@ -0,0 +1,129 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import select, func, text, case, and_
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Machine, MeterReading
+
+READING_CHUNK_SIZE = 1000
+
+
+def readings_now() -> datetime.datetime:
+    """
+    The clock reading times are compared with: naive UTC, like the stored reading times. Usage
+    windows and the service forecast must use the same one.
+    """
+    return datetime.datetime.utcnow()
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"meter_readings_{month.year:04d}_{month.month:02d}"
+
+
+async def ensure_partitions(times) -> None:
+    """
+    Creates the monthly partitions covering `times` that don't exist yet. Each is created in its own
+    short transaction on a separate connection: attaching a partition takes an ACCESS EXCLUSIVE lock
+    on meter_readings, which must not be held for a whole ingestion. Call it before the caller's
+    transaction touches meter_readings.
+    """
+    from database import engine
+
+    months = sorted({datetime.date(t.year, t.month, 1) for t in times})
+    for start in months:
+        end = datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        async with engine.begin() as conn:
+            if await conn.scalar(text("SELECT to_regclass(:name)"), {"name": partition_name(start)}) is not None:
+                continue
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF meter_readings "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+
+
+async def ensure_upcoming_partitions() -> None:
+    """This month's and next month's partitions, at startup: most ingestions then create none."""
+    now = readings_now()
+    await ensure_partitions([now, now + datetime.timedelta(days=31)])
+
+
+async def record_meter_readings(session: AsyncSession, readings, version: int) -> int:
+    """
+    Appends (machine_id, reading_time, service_meter) rows. A reading already recorded for the
+    same machine and time (the same file uploaded twice) is skipped. Returns the rows offered.
+    Their partitions must exist (ensure_partitions).
+    """
+    rows = [
+        {"machine_id": machine_id, "reading_time": reading_time, "service_meter": meter, "data_version": version}
+        for machine_id, reading_time, meter in readings
+    ]
+    if not rows:
+        return 0
+    for i in range(0, len(rows), READING_CHUNK_SIZE):
+        stmt = insert(MeterReading).values(rows[i:i + READING_CHUNK_SIZE])
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=['machine_id', 'reading_time']))
+    return len(rows)
+
+
+def usage_rates_query(window_days: int, machine_id: Optional[int] = None):
+    """
+    Per-machine usage over the last `window_days` of readings, computed in SQL:
+    - hours_per_day: least-squares slope of meter hours against time (regr_slope), robust to a noisy reading,
+    - recent_hours_per_day: rate between the two latest readings (lag() window),
+    - latest_meter / latest_reading: the most recent reading.
+    A meter reset (a lower reading than the previous one, e.g. a replaced meter) starts a new
+    segment: every figure only covers the readings since the machine's last reset.
+    """
+    since = readings_now() - datetime.timedelta(days=window_days)
+    days = func.extract("epoch", MeterReading.reading_time) / 86400.0
+    window = dict(partition_by=MeterReading.machine_id, order_by=MeterReading.reading_time)
+
+    readings = select(
+        MeterReading.machine_id,
+        MeterReading.reading_time,
+        MeterReading.service_meter,
+        days.label("day"),
+        (MeterReading.service_meter - func.lag(MeterReading.service_meter).over(**window)).label("delta_hours"),
+        (days - func.lag(days).over(**window)).label("delta_days"),
+        func.row_number().over(
+            partition_by=MeterReading.machine_id, order_by=MeterReading.reading_time.desc()
+        ).label("recency"),
+    ).where(MeterReading.reading_time >= since)
+    if machine_id is not None:
+        readings = readings.where(MeterReading.machine_id == machine_id)
+    d = readings.subquery()
+
+    # Resets up to each reading, and in total: the last segment is where both are equal
+    reset = case((d.c.delta_hours < 0, 1), else_=0)
+    r = select(
+        d,
+        func.sum(reset).over(partition_by=d.c.machine_id, order_by=d.c.reading_time).label("segment"),
+        func.sum(reset).over(partition_by=d.c.machine_id).label("resets"),
+    ).subquery()
+
+    interval_rate = case(
+        (and_(r.c.delta_hours >= 0, r.c.delta_days > 0), r.c.delta_hours / r.c.delta_days),
+        else_=None,
+    )
+    return (
+        select(
+            r.c.machine_id,
+            Machine.serial_number,
+            func.count().label("readings"),
+            func.min(r.c.reading_time).label("first_reading"),
+            func.max(r.c.reading_time).label("latest_reading"),
+            func.array_agg(aggregate_order_by(r.c.service_meter, r.c.reading_time.desc()))[1].label("latest_meter"),
+            func.regr_slope(r.c.service_meter, r.c.day).label("hours_per_day"),
+            func.max(interval_rate).filter(r.c.recency == 1).label("recent_hours_per_day"),
+        )
+        .join(Machine, Machine.id == r.c.machine_id)
+        .where(r.c.segment == r.c.resets)
+        .group_by(r.c.machine_id, Machine.serial_number)
+        .order_by(r.c.machine_id)
+    )
+
+
+async def get_usage_rates(session: AsyncSession, window_days: int, machine_id: Optional[int] = None) -> list:
+    result = await session.execute(usage_rates_query(window_days, machine_id))
+    return [dict(row) for row in result.mappings()]
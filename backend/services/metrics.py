@@ -0,0 +1,207 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+# Several uvicorn/gunicorn workers: set PROMETHEUS_MULTIPROC_DIR (an empty directory, wiped on deploy)
+# and every worker's samples are aggregated at /metrics.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency", ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being served", ["method"], multiprocess_mode="livesum"
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size", ["method", "route"], buckets=SIZE_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "http_request_db_queries", "SQL statements per request", ["method", "route"], buckets=QUERY_COUNT_BUCKETS
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request", ["method", "route"]
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed (requests and background jobs)")
+DB_QUERY_SECONDS = Counter("db_query_duration_seconds_total", "Time spent executing SQL")
+
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", ["pool"], multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow_in_use", "Overflow connections in use", ["pool"], multiprocess_mode="livesum")
+DB_POOL_WAIT_SECONDS = Gauge(
+    "db_pool_checkout_wait_seconds_total", "Cumulative time spent waiting for a connection", ["pool"],
+    multiprocess_mode="livesum"
+)
+
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_duration_seconds", "Workbook ingestion stage duration", ["stage"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+INGESTION_SECONDS = Histogram(
+    "ingestion_duration_seconds", "Whole workbook ingestion", buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+GENERATION_STAGE_SECONDS = Histogram(
+    "intervention_generation_stage_duration_seconds", "Intervention generation stage duration", ["stage"]
+)
+GENERATION_SECONDS = Histogram(
+    "intervention_generation_duration_seconds", "Whole intervention generation",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+FLEET_SNAPSHOT_BYTES = Gauge(
+    "fleet_snapshot_bytes", "Memory private to each worker's fleet snapshot", multiprocess_mode="livesum"
+)
+FLEET_SNAPSHOT_MAPPED_BYTES = Gauge(
+    "fleet_snapshot_mapped_bytes", "Size of the shared fleet snapshot file the workers map", multiprocess_mode="livemax"
+)
+FLEET_SNAPSHOT_BUILD_SECONDS = Gauge(
+    "fleet_snapshot_build_seconds", "Duration of the last fleet snapshot rebuild", multiprocess_mode="livemax"
+)
+
+
+class StageTimer:
+    """Times consecutive stages of a job: each mark() closes the stage that began at the previous mark."""
+
+    def __init__(self, stage_histogram: Histogram, total_histogram: Optional[Histogram] = None):
+        self.stage_histogram = stage_histogram
+        self.total_histogram = total_histogram
+        self.start = self.last = time.perf_counter()
+        self.durations = {}
+
+    def mark(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed, self.last = now - self.last, now
+        self.durations[stage] = self.durations.get(stage, 0.0) + elapsed
+        self.stage_histogram.labels(stage).observe(elapsed)
+        return elapsed
+
+    def finish(self) -> float:
+        total = time.perf_counter() - self.start
+        if self.total_histogram is not None:
+            self.total_histogram.observe(total)
+        return total
+
+
+# --- Per-request SQL accounting ---
+
+class RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Requests being served by this worker (HTTP_IN_FLIGHT is summed across workers)
+_requests_in_flight = 0
+
+
+def requests_in_flight() -> int:
+    return _requests_in_flight
+
+
+# SQLAlchemy runs cursor events in a greenlet sharing the request task's context, so the
+# middleware's stats object is visible here.
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def current_request_db_stats() -> Optional[RequestDbStats]:
+    return _request_db_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.inc(elapsed)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine) -> None:
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def update_pool_gauges() -> None:
+    from database import pool_status
+
+    status = pool_status()
+    pools = {"primary": status}
+    if "replica" in status:
+        pools["replica"] = status["replica"]
+    for name, s in pools.items():
+        DB_POOL_CHECKED_OUT.labels(name).set(s["checked_out"])
+        DB_POOL_OVERFLOW.labels(name).set(s["overflow_in_use"])
+        DB_POOL_WAIT_SECONDS.labels(name).set(s["checkout_wait_seconds_total"])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (streaming responses such as SSE pass through untouched).
+    Routes are labelled by their template (/machines/usage, not the concrete URL) to bound cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _requests_in_flight
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = {"code": 500, "bytes": 0}
+        stats = RequestDbStats()
+        token = _request_db_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                status["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.labels(method).inc()
+        _requests_in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.labels(method).dec()
+            _requests_in_flight -= 1
+            _request_db_stats.reset(token)
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status["code"])).observe(elapsed)
+            HTTP_RESPONSE_BYTES.labels(method, route).observe(status["bytes"])
+            DB_QUERIES_PER_REQUEST.labels(method, route).observe(stats.queries)
+            DB_SECONDS_PER_REQUEST.labels(method, route).observe(stats.seconds)
+            update_pool_gauges()
+
+
+def render_metrics():
+    """(body, content type) for GET /metrics."""
+    update_pool_gauges()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from services.metrics import current_request_db_stats, requests_in_flight
+
+# On-demand profiling of single requests, for admins:
+#   X-Profile: 1        (or ?profile=1) profile the request, store the result, answer normally
+#                       with X-Profile-Id; download it from GET /admin/profiles/{id}
+#   X-Profile: inline   (or ?profile=inline) answer with the profile instead of the response body,
+#                       its metadata in X-Profile-Meta
+#
+# Profiles are folded stacks ("frame;frame;frame count" lines), readable by flamegraph.pl,
+# speedscope and inferno. Samples taken while the event loop waits on I/O (mostly SQL round
+# trips) are folded into a single "[awaiting I/O]" frame; the SQL count and time of the request
+# are in the profile's metadata. Only the event-loop thread is sampled: sync (def) endpoints run in
+# the threadpool and show up as waiting. Requests without the flag only pay a header lookup.
+#
+# Samples are attributed to the request's task: while another request's task runs, the sample is
+# only counted in the metadata (other_task_samples), and loop callbacks outside any task (transport
+# and driver protocol code) fold into "[event loop]". Tasks the request spawns itself count as
+# other tasks. concurrent_requests is the most other requests this worker served while sampling.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IDLE_FRAME = "[awaiting I/O]"
+LOOP_FRAME = "[event loop]"
+# The event loop blocks here between callbacks
+IDLE_FUNCTIONS = {("selectors.py", "select"), ("selectors.py", "poll")}
+
+
+def frame_label(code) -> str:
+    path = code.co_filename
+    if path.startswith(BACKEND_DIR):
+        path = os.path.relpath(path, BACKEND_DIR)
+    else:
+        # site-packages/sqlalchemy/orm/loading.py -> sqlalchemy/orm/loading.py
+        parts = path.replace("\\", "/").split("/site-packages/")
+        path = parts[-1] if len(parts) > 1 else os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Sampler:
+    """
+    Samples the event-loop thread's Python stack from a background thread and counts the folded
+    stacks of the samples taken while `task` runs (or the loop idles).
+    """
+
+    def __init__(self, thread_id: int, loop, task, interval: float):
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.other_task_samples = 0
+        self.concurrent_requests = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.concurrent_requests = max(self.concurrent_requests, requests_in_flight() - 1)
+            task = asyncio.current_task(self.loop)
+            frame = sys._current_frames().get(self.thread_id)
+            # The loop may have switched tasks between the two reads: drop the sample
+            if frame is None or asyncio.current_task(self.loop) is not task:
+                continue
+            self.samples += 1
+            if task is not None and task is not self.task:
+                self.other_task_samples += 1
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+                self.stacks[IDLE_FRAME] += 1
+                continue
+            if task is None:
+                self.stacks[LOOP_FRAME] += 1
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_mode(scope) -> Optional[str]:
+    """'store', 'inline' or None, from the X-Profile header or the profile query flag."""
+    value = None
+    for name, header_value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            value = header_value.decode("latin-1")
+            break
+    if value is None:
+        query = scope.get("query_string", b"")
+        if b"profile=" not in query:
+            return None
+        match = re.search(rb"(?:^|&)profile=([^&]*)", query)
+        if match is None:
+            return None
+        value = match.group(1).decode("latin-1")
+    value = value.strip().lower()
+    if value in ("", "0", "false", "off"):
+        return None
+    return "inline" if value == "inline" else "store"
+
+
+def is_admin_token(scope) -> bool:
+    """Checks the bearer token's signature and role claim (no database lookup)."""
+    from jose import JWTError, jwt
+    from routers.auth import SECRET_KEY, ALGORITHM
+
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("role") == "admin"
+            except JWTError:
+                return False
+    return False
+
+
+def profile_path(profile_id: str, ext: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+
+
+def save_profile(profile_id: str, folded: str, meta: dict) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(profile_path(profile_id, "folded"), "w") as f:
+        f.write(folded)
+    with open(profile_path(profile_id, "json"), "w") as f:
+        json.dump(meta, f)
+    # Keep the newest PROFILE_KEEP
+    metas = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+        key=os.path.getmtime,
+    )
+    for old in metas[:-PROFILE_KEEP]:
+        for path in (old, old[:-len(".json")] + ".folded"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    metas = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(metas, key=lambda m: m["created"], reverse=True)
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, "folded")) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware. Sits inside MetricsMiddleware so the request's SQL count and time can be
+    attached to the profile. Non-admins sending the flag get a 403.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = profile_mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+        if not is_admin_token(scope):
+            return await self._send_text(send, 403, "Profiling requires an admin token\n")
+
+        profile_id = uuid.uuid4().hex[:12]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if mode == "inline":
+                    return
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            elif mode == "inline":
+                # The profile replaces the body
+                return
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        sampler = Sampler(threading.get_ident(), loop, asyncio.current_task(), PROFILE_INTERVAL_MS / 1000)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - start
+            stats = current_request_db_stats()
+            meta = {
+                "id": profile_id,
+                "created": time.time(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status["code"],
+                "seconds": round(elapsed, 4),
+                "samples": sampler.samples,
+                "other_task_samples": sampler.other_task_samples,
+                "concurrent_requests": sampler.concurrent_requests,
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "sql_queries": stats.queries if stats else None,
+                "sql_seconds": round(stats.seconds, 4) if stats else None,
+            }
+            folded = sampler.folded()
+            # File writes and pruning stay off the event loop
+            await loop.run_in_executor(None, save_profile, profile_id, folded, meta)
+
+        if mode == "inline":
+            await self._send_text(send, 200, folded, [
+                (b"x-profile-id", profile_id.encode()),
+                (b"x-profile-meta", json.dumps(meta).encode()),
+            ])
+
+    @staticmethod
+    async def _send_text(send, status: int, text: str, headers=()):
+        body = text.encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", str(len(body)).encode()), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
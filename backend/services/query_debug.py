@@ -0,0 +1,125 @@
+import logging
+import os
+import traceback
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services.metrics import current_request_db_stats
+
+logger = logging.getLogger(__name__)
+
+# Development/test aid, off in production:
+#   QUERY_DEBUG=warn   log lazy loads and requests over the statement budget
+#   QUERY_DEBUG=raise  fail them instead (the request returns 500 with the offending call site logged)
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "off").lower()
+# Max SQL statements per read request before it is reported (0 disables the budget).
+# Uploads and generation issue chunked bulk statements by design and are not budgeted.
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "25"))
+BUDGETED_METHODS = ("GET", "HEAD")
+
+QUERY_COUNT_HEADER = "x-query-count"
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_request_budget: ContextVar[int] = ContextVar("request_query_budget", default=0)
+
+
+class QueryBudgetError(RuntimeError):
+    """A lazy relationship load or a request over QUERY_BUDGET, raised when QUERY_DEBUG=raise."""
+
+
+def enabled() -> bool:
+    return QUERY_DEBUG in ("warn", "raise")
+
+
+def call_site() -> str:
+    """Innermost frame of our own code (not SQLAlchemy, not this module) that led to the statement."""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(BACKEND_DIR) and path != os.path.abspath(__file__) and "site-packages" not in path:
+            return f"{os.path.relpath(path, BACKEND_DIR)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def report(message: str) -> None:
+    if QUERY_DEBUG == "raise":
+        raise QueryBudgetError(message)
+    logger.warning(message)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    # selectinload/joinedload also run relationship loads, but without lazy_loaded_from:
+    # only per-instance loads are the N+1 pattern (and raise MissingGreenlet under asyncio)
+    if orm_execute_state.is_relationship_load and orm_execute_state.lazy_loaded_from is not None:
+        path = orm_execute_state.loader_strategy_path
+        relationship = str(path[-1]) if path else "?"
+        report(f"Lazy load of {relationship} at {call_site()}; add selectinload({relationship}) to the query")
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    budget = _request_budget.get()
+    stats = current_request_db_stats()
+    # Reported once, on the first statement over the budget
+    if budget and stats is not None and stats.queries == budget + 1:
+        report(f"Request exceeded its budget of {budget} SQL statements at {call_site()}")
+
+
+def install(engines) -> None:
+    """Registers the detectors; call after services.metrics.instrument_engine so the request counts are current."""
+    if not enabled():
+        return
+    if not event.contains(Session, "do_orm_execute", _do_orm_execute):
+        event.listen(Session, "do_orm_execute", _do_orm_execute)
+    for engine in engines:
+        if not event.contains(engine.sync_engine, "after_cursor_execute", _after_cursor_execute):
+            event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    logger.info(f"Query debugging on ({QUERY_DEBUG}, budget {QUERY_BUDGET} statements per request)")
+
+
+class QueryCountMiddleware:
+    """
+    Arms QUERY_BUDGET for read requests and adds X-Query-Count (statements run so far by this
+    request) to the response headers, so test scripts can assert statement budgets per endpoint.
+    Must sit inside MetricsMiddleware, which owns the per-request counter.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                stats = current_request_db_stats()
+                if stats is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((QUERY_COUNT_HEADER.encode(), str(stats.queries).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _request_budget.set(QUERY_BUDGET if scope["method"] in BUDGETED_METHODS else 0)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_budget.reset(token)
+
+
+def assert_query_budget(response, max_queries: int, label: Optional[str] = None) -> Optional[int]:
+    """
+    For the test_* scripts: checks the X-Query-Count header of an httpx/requests response.
+    Returns the count, or None (with a note) when the server doesn't run with QUERY_DEBUG.
+    """
+    label = label or str(response.request.url)
+    value = response.headers.get(QUERY_COUNT_HEADER)
+    if value is None:
+        print(f"  (no {QUERY_COUNT_HEADER} header for {label}: start the API with QUERY_DEBUG=warn to check budgets)")
+        return None
+    count = int(value)
+    assert count <= max_queries, f"{label}: {count} SQL statements, budget {max_queries}"
+    print(f"  {label}: {count} SQL statements (budget {max_queries})")
+    return count
@@ -0,0 +1,128 @@
+import logging
+import time
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Client, ClientRollup, FleetRollup, Intervention, Machine, PssrRollup
+from services.data_version import get_data_version
+from services.status_engine import STATUS_CRITICAL, STATUS_MAINTENANCE, STATUS_OPERATIONAL, evaluate_fleet
+
+logger = logging.getLogger(__name__)
+
+# Per-client, per-PSSR and fleet-wide counts (machines by status, pending interventions by
+# priority), read directly by the rollup endpoints and /admin/stats instead of grouping the fleet
+# on every call. Machines without a client only count in the fleet-wide row.
+# Rebuilt in full inside the transaction that changes the data (ingestion, intervention
+# generation), so readers see the counts of the data version they read.
+
+# Serializes rebuilds that don't hold the data_version row lock (startup, seeding)
+ROLLUP_LOCK_ID = 7301
+INSERT_CHUNK_SIZE = 1000
+PRIORITY_COLUMNS = {"HIGH": "pending_high", "MEDIUM": "pending_medium", "LOW": "pending_low"}
+COUNT_COLUMNS = ["machines", "critical", "maintenance", "operational", "pending_high", "pending_medium", "pending_low"]
+
+
+async def compute_rollups(session: AsyncSession, data_version: int) -> tuple:
+    """(client rows, pssr rows, fleet row) ready to insert."""
+    fleet = await evaluate_fleet(session)
+    machine_clients = dict((await session.execute(select(Machine.id, Machine.client_id))).all())
+    clients = (await session.execute(select(Client.id, Client.name, Client.pssr).order_by(Client.id))).all()
+    pending = (await session.execute(
+        select(Machine.client_id, Intervention.priority, func.count())
+        .join(Machine, Intervention.machine_id == Machine.id)
+        .where(Intervention.status == 'PENDING')
+        .group_by(Machine.client_id, Intervention.priority)
+    )).all()
+
+    # Machine -> client row, -1 without a client; then one bincount per status
+    index = {client_id: i for i, (client_id, _, _) in enumerate(clients)}
+    client_pos = np.array([index.get(machine_clients.get(int(i)), -1) for i in fleet.ids], dtype=np.int64)
+    assigned = client_pos >= 0
+
+    def count(mask) -> np.ndarray:
+        return np.bincount(client_pos[assigned & mask], minlength=len(clients))
+
+    status_masks = {
+        "critical": fleet.status == STATUS_CRITICAL,
+        "maintenance": fleet.status == STATUS_MAINTENANCE,
+        "operational": fleet.status == STATUS_OPERATIONAL,
+    }
+    machines = count(np.ones(len(fleet), dtype=bool))
+    by_status = {status: count(mask) for status, mask in status_masks.items()}
+    fleet_row = {
+        "id": 1, "machines": len(fleet),
+        **{status: int(np.count_nonzero(mask)) for status, mask in status_masks.items()},
+        "pending_high": 0, "pending_medium": 0, "pending_low": 0,
+        "data_version": data_version,
+    }
+
+    client_rows = [
+        {
+            "client_id": client_id, "name": name, "pssr": pssr,
+            "machines": int(machines[i]),
+            **{status: int(counts[i]) for status, counts in by_status.items()},
+            "pending_high": 0, "pending_medium": 0, "pending_low": 0,
+            "data_version": data_version,
+        }
+        for i, (client_id, name, pssr) in enumerate(clients)
+    ]
+    for client_id, priority, n in pending:
+        if priority not in PRIORITY_COLUMNS:
+            continue
+        fleet_row[PRIORITY_COLUMNS[priority]] += n
+        if client_id in index:
+            client_rows[index[client_id]][PRIORITY_COLUMNS[priority]] = n
+
+    pssr_rows = {}
+    for row in client_rows:
+        key = row["pssr"] or ""
+        out = pssr_rows.setdefault(key, {"pssr": key, "clients": 0, **{c: 0 for c in COUNT_COLUMNS},
+                                         "data_version": data_version})
+        out["clients"] += 1
+        for c in COUNT_COLUMNS:
+            out[c] += row[c]
+    return client_rows, list(pssr_rows.values()), fleet_row
+
+
+async def refresh_rollups(session: AsyncSession, data_version: int) -> dict:
+    """Recomputes the rollup tables in the caller's transaction (the caller commits)."""
+    start = time.perf_counter()
+    await session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID})
+    client_rows, pssr_rows, fleet_row = await compute_rollups(session, data_version)
+    await session.execute(delete(ClientRollup))
+    await session.execute(delete(PssrRollup))
+    await session.execute(delete(FleetRollup))
+    await session.execute(insert(FleetRollup).values(fleet_row))
+    for table, rows in ((ClientRollup, client_rows), (PssrRollup, pssr_rows)):
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            await session.execute(insert(table).values(rows[i:i + INSERT_CHUNK_SIZE]))
+    logger.info(f"Rollups refreshed for version {data_version}: {len(client_rows)} clients, "
+                f"{len(pssr_rows)} PSSR in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return {"clients": len(client_rows), "pssr": len(pssr_rows)}
+
+
+async def rollups_version(session: AsyncSession) -> Optional[int]:
+    """Data version the stored rollups were computed for (None when empty)."""
+    return await session.scalar(select(FleetRollup.data_version).where(FleetRollup.id == 1))
+
+
+async def ensure_rollups(session: AsyncSession) -> bool:
+    """
+    Rebuilds the rollups when they lag the data (fresh migration, seeded database, rows written
+    by an older release). Commits. Returns whether a rebuild ran.
+    """
+    version = await get_data_version(session)
+    stored = await rollups_version(session)
+    if stored is not None and stored >= version:
+        await session.rollback()
+        return False
+    machines = await session.scalar(select(func.count(Machine.id)))
+    if stored is None and not machines:
+        await session.rollback()
+        return False
+    await refresh_rollups(session, version)
+    await session.commit()
+    return True
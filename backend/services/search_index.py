@@ -0,0 +1,146 @@
+from bisect import bisect_left
+from typing import List, Optional
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Machine, Client
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+
+
+def normalize(value: Optional[str]) -> str:
+    return str(value).strip().casefold() if value else ""
+
+
+class SuggestIndex:
+    """
+    In-memory autocomplete index over machine serials, models and client names.
+
+    Two structures are kept:
+    - a sorted list of (key, position) for prefix lookups (bisect),
+    - trigram posting lists for substring lookups (same semantics as ILIKE '%q%').
+    The index is immutable once built; rebuilds swap the module-level instance.
+    """
+
+    def __init__(self, rows):
+        # rows: iterable of (machine_id, serial_number, model, client_name)
+        self.ids = []
+        self.labels = []
+        self.serials = []
+        self.models = []
+        self.clients = []
+        self.haystacks = []
+
+        prefix_keys = []
+        ngrams = {}
+
+        for pos, (machine_id, serial, model, client) in enumerate(
+            sorted(rows, key=lambda r: normalize(r[1]))
+        ):
+            self.ids.append(machine_id)
+            self.serials.append(serial)
+            self.models.append(model)
+            self.clients.append(client)
+            self.labels.append(" · ".join(p for p in (serial, model, client) if p))
+
+            keys = {normalize(serial), normalize(model), normalize(client)}
+            # Client names are often several words ("Ets Sodevit"), allow prefix on each word
+            keys.update(normalize(client).split())
+            keys.discard("")
+            for key in keys:
+                prefix_keys.append((key, pos))
+
+            haystack = "\x00".join((normalize(serial), normalize(model), normalize(client)))
+            self.haystacks.append(haystack)
+            for i in range(len(haystack) - NGRAM_SIZE + 1):
+                gram = haystack[i:i + NGRAM_SIZE]
+                if "\x00" in gram:
+                    continue
+                postings = ngrams.setdefault(gram, [])
+                if not postings or postings[-1] != pos:
+                    postings.append(pos)
+
+        prefix_keys.sort()
+        self.prefix_keys = [k for k, _ in prefix_keys]
+        self.prefix_positions = [p for _, p in prefix_keys]
+        self.ngrams = ngrams
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix_matches(self, q: str, limit: int, seen: set) -> List[int]:
+        matches = []
+        i = bisect_left(self.prefix_keys, q)
+        while i < len(self.prefix_keys) and self.prefix_keys[i].startswith(q):
+            pos = self.prefix_positions[i]
+            if pos not in seen:
+                seen.add(pos)
+                matches.append(pos)
+                if len(matches) >= limit:
+                    break
+            i += 1
+        return matches
+
+    def _substring_matches(self, q: str, limit: int, seen: set) -> List[int]:
+        if len(q) < NGRAM_SIZE:
+            return []
+        postings = []
+        for i in range(len(q) - NGRAM_SIZE + 1):
+            p = self.ngrams.get(q[i:i + NGRAM_SIZE])
+            if p is None:
+                return []
+            postings.append(p)
+        # Walk the shortest posting list and verify candidates against the full text
+        postings.sort(key=len)
+        matches = []
+        for pos in postings[0]:
+            if pos in seen or q not in self.haystacks[pos]:
+                continue
+            seen.add(pos)
+            matches.append(pos)
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def suggest(self, q: str, limit: int = 10) -> List[dict]:
+        q = normalize(q)
+        if not q:
+            return []
+        seen = set()
+        positions = self._prefix_matches(q, limit, seen)
+        if len(positions) < limit:
+            positions += self._substring_matches(q, limit - len(positions), seen)
+        return [
+            {
+                "id": self.ids[pos],
+                "label": self.labels[pos],
+                "serialNumber": self.serials[pos],
+                "model": self.models[pos],
+                "client": self.clients[pos],
+            }
+            for pos in positions
+        ]
+
+
+_index = SuggestIndex([])
+
+
+def get_suggest_index() -> SuggestIndex:
+    return _index
+
+
+async def rebuild_suggest_index(session: AsyncSession) -> SuggestIndex:
+    """Reload serials, models and client names from the DB and swap in a fresh index."""
+    global _index
+    start = time.perf_counter()
+    result = await session.execute(
+        select(Machine.id, Machine.serial_number, Machine.model, Client.name)
+        .outerjoin(Client, Machine.client_id == Client.id)
+    )
+    _index = SuggestIndex(result.all())
+    logger.info(f"Suggest index rebuilt: {len(_index)} machines in {time.perf_counter() - start:.3f}s")
+    return _index
@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# Fixed binary layout of a published fleet snapshot (one file per data generation, see
+# services.data_version.get_data_generation):
+#
+#   header    MAGIC, layout version, section count, rows, data version, generation stamp,
+#             built at, build seconds
+#   table     one (name, offset, nbytes) entry per section, in SECTIONS order
+#   sections  little-endian, each starting on a 64-byte boundary
+#
+# Numeric columns are raw arrays. A string column is two sections: "<name>.offsets" (int64,
+# count + 1) and "<name>.data" (the UTF-8 strings back to back). Readers np.frombuffer() the
+# read-only mapping, so every process mapping the same file shares its pages.
+# Bump LAYOUT_VERSION whenever SECTIONS changes: readers reject files of another layout.
+
+MAGIC = b"FLEETSNP"
+LAYOUT_VERSION = 1
+ALIGN = 64
+HEADER = struct.Struct("<8sHHIqqqdd")
+ENTRY = struct.Struct("<24sQQ")
+
+NUMERIC_COLUMNS = (
+    ("ids", "<i8"),
+    ("lat", "<f8"),
+    ("lng", "<f8"),
+    ("status_code", "i1"),
+    ("psi_code", "i1"),
+    ("status", "i1"),
+    ("model_codes", "<i4"),
+    ("client_codes", "<i4"),
+    ("has_cvaf", "?"),
+    ("cva_low", "?"),
+    ("flash_update", "?"),
+    ("pending_high", "?"),
+    ("pending_medium", "?"),
+    ("cva_end", "<M8[D]"),
+    ("ps_deadline", "<M8[D]"),
+    ("serial_order", "<i4"),
+)
+STRING_COLUMNS = ("serials", "haystacks", "models", "clients")
+SECTIONS = [name for name, _ in NUMERIC_COLUMNS] + [
+    f"{name}.{part}" for name in STRING_COLUMNS for part in ("offsets", "data")
+]
+
+
+class StringColumn:
+    """UTF-8 strings stored back to back: bytes offsets[i]:offsets[i + 1] (from `base`) are string i."""
+
+    def __init__(self, offsets: np.ndarray, buffer, base: int = 0):
+        self.offsets = offsets
+        self.buffer = buffer # bytes or mmap
+        self.base = base
+
+    @classmethod
+    def from_strings(cls, values, terminator: bytes = b"") -> "StringColumn":
+        encoded = [v.encode() + terminator for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(offsets, b"".join(encoded))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i) -> bytes:
+        return self.buffer[self.base + int(self.offsets[i]):self.base + int(self.offsets[i + 1])]
+
+    def __getitem__(self, i) -> str:
+        return self.raw(i).decode()
+
+    def to_list(self) -> list:
+        return [self[i] for i in range(len(self))]
+
+    def data(self) -> bytes:
+        return bytes(self.buffer[self.base:self.base + int(self.offsets[-1])])
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + int(self.offsets[-1])
+
+    def find_rows(self, needle: bytes) -> np.ndarray:
+        """
+        Strings containing `needle`, scanning the buffer with bytes.find (mmap.find on a mapping).
+        Matches must not span strings: store the strings with a terminator the needle can't contain.
+        """
+        rows = []
+        end = self.base + int(self.offsets[-1])
+        pos = self.base
+        while True:
+            pos = self.buffer.find(needle, pos, end)
+            if pos < 0:
+                break
+            row = int(np.searchsorted(self.offsets, pos - self.base, side="right")) - 1
+            rows.append(row)
+            # One hit per string is enough
+            pos = self.base + int(self.offsets[row + 1])
+        return np.array(rows, dtype=np.int64)
+
+    def find_equal(self, value: str, order: np.ndarray) -> np.ndarray:
+        """Strings equal to `value` (binary search), `order` being the indexes sorted by their bytes."""
+        key = value.encode()
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        while lo < len(order) and self.raw(order[lo]) == key:
+            rows.append(int(order[lo]))
+            lo += 1
+        return np.array(sorted(rows), dtype=np.int64)
+
+
+class SnapshotFile:
+    """A mapped snapshot file: read-only column views over one shared mapping."""
+
+    def __init__(self, path: str, rows: int, data_version: int, generation: int, built_at: float,
+                 build_seconds: float, columns: dict, strings: dict, size: int):
+        self.path = path
+        self.rows = rows
+        self.data_version = data_version
+        self.generation = generation
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.columns = columns
+        self.strings = strings
+        self.size = size
+
+
+def align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_snapshot_file(path: str, rows: int, data_version: int, generation: int, built_at: float,
+                        build_seconds: float, columns: dict, strings: dict) -> int:
+    """
+    Writes the snapshot next to `path`, fsyncs it and renames it into place, so readers only ever
+    see complete files. Returns the file size.
+    """
+    payloads = [np.ascontiguousarray(columns[name], dtype=dtype).tobytes() for name, dtype in NUMERIC_COLUMNS]
+    for name in STRING_COLUMNS:
+        payloads.append(strings[name].offsets.astype("<i8").tobytes())
+        payloads.append(strings[name].data())
+
+    offset = align(HEADER.size + ENTRY.size * len(SECTIONS))
+    table = []
+    for name, payload in zip(SECTIONS, payloads):
+        table.append((name, offset, len(payload)))
+        offset = align(offset + len(payload))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, LAYOUT_VERSION, len(SECTIONS), 0, rows, data_version, generation,
+                                built_at, build_seconds))
+            for name, section_offset, nbytes in table:
+                f.write(ENTRY.pack(name.encode(), section_offset, nbytes))
+            for (name, section_offset, _), payload in zip(table, payloads):
+                f.seek(section_offset)
+                f.write(payload)
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return offset
+
+
+def map_snapshot_file(path: str) -> SnapshotFile:
+    """Maps a published snapshot read-only. Raises ValueError for a file of another layout."""
+    with open(path, "rb") as f:
+        # The mapping outlives the descriptor, and the file itself once a newer one replaces it
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, layout, count, _, rows, data_version, generation, built_at, build_seconds = HEADER.unpack_from(mapping, 0)
+    if magic != MAGIC or layout != LAYOUT_VERSION or count != len(SECTIONS):
+        raise ValueError(f"{path}: not a layout {LAYOUT_VERSION} fleet snapshot")
+
+    table = {}
+    for i, expected in enumerate(SECTIONS):
+        name, offset, nbytes = ENTRY.unpack_from(mapping, HEADER.size + ENTRY.size * i)
+        if name.rstrip(b"\0").decode() != expected:
+            raise ValueError(f"{path}: section {i} is {name!r}, expected {expected}")
+        table[expected] = (offset, nbytes)
+
+    def view(name: str, dtype) -> np.ndarray:
+        offset, nbytes = table[name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(mapping, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset)
+
+    columns = {name: view(name, dtype) for name, dtype in NUMERIC_COLUMNS}
+    strings = {
+        name: StringColumn(view(f"{name}.offsets", "<i8"), mapping, base=table[f"{name}.data"][0])
+        for name in STRING_COLUMNS
+    }
+    return SnapshotFile(path, rows, data_version, generation, built_at, build_seconds, columns, strings, len(mapping))
+
+
+def snapshot_path(directory: str, data_version: int, generation: int) -> str:
+    return os.path.join(directory, f"fleet-{data_version:012d}-{generation}.snap")
+
+
+def prune_snapshot_files(directory: str, keep: int) -> None:
+    """Removes all but the `keep` most recently published snapshots (workers still mapping one keep their pages)."""
+    paths = sorted(
+        (os.path.join(directory, n) for n in os.listdir(directory) if n.startswith("fleet-") and n.endswith(".snap")),
+        key=os.path.getmtime,
+    )
+    for path in paths[:-keep]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
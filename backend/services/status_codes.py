@@ -0,0 +1,62 @@
+"""
+Small-int codes derived from the free-text Excel columns at ingestion time.
+
+The raw strings are kept for display; filters and status rules compare the codes.
+Labels live in the `status_codes` lookup table (seeded by migration d7f3b9a2c4e6).
+"""
+
+MACHINE_STATUS_OK = 0
+MACHINE_STATUS_URGENT = 1
+
+PSI_UNKNOWN = 0
+PSI_INSPECTED = 1
+PSI_NOT_INSPECTED = 2
+
+SCORE_UNKNOWN = 0
+SCORE_OK = 1
+SCORE_LOW = 2
+SCORE_MISSING = 3 # exactly '0/1': also low, and the trigger for CVAF interventions
+
+LOW_SCORE_CODES = (SCORE_LOW, SCORE_MISSING)
+
+# (domain, code, label) rows of the lookup table
+STATUS_CODE_LABELS = [
+    ("machine_status", MACHINE_STATUS_OK, "OK"),
+    ("machine_status", MACHINE_STATUS_URGENT, "URGENT"),
+    ("psi_status", PSI_UNKNOWN, "UNKNOWN"),
+    ("psi_status", PSI_INSPECTED, "INSPECTED"),
+    ("psi_status", PSI_NOT_INSPECTED, "NOT_INSPECTED"),
+    ("cva_score", SCORE_UNKNOWN, "UNKNOWN"),
+    ("cva_score", SCORE_OK, "OK"),
+    ("cva_score", SCORE_LOW, "LOW"),
+    ("cva_score", SCORE_MISSING, "MISSING"),
+]
+
+URGENT_STATUS_TERMS = ["défaut", "urgent", "critique", "critical", "breakdown"]
+NOT_INSPECTED = 'Non Inspecté'
+
+
+def machine_status_code(status) -> int:
+    raw = str(status).lower() if status else ""
+    return MACHINE_STATUS_URGENT if any(term in raw for term in URGENT_STATUS_TERMS) else MACHINE_STATUS_OK
+
+
+def psi_code(psi_status) -> int:
+    if psi_status is None:
+        return PSI_UNKNOWN
+    return PSI_NOT_INSPECTED if psi_status == NOT_INSPECTED else PSI_INSPECTED
+
+
+def score_code(val) -> int:
+    if val is None:
+        return SCORE_UNKNOWN
+    s_val = str(val).strip().lower()
+    if s_val == '0/1':
+        return SCORE_MISSING
+    if s_val in ['0', '1', '0.0', '1.0']:
+        return SCORE_LOW
+    if '/' in s_val:
+        parts = [p.strip() for p in s_val.split('/')]
+        if parts[0] == '0' and len(parts) > 1 and parts[1] != '0':
+            return SCORE_LOW
+    return SCORE_OK
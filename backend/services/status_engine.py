@@ -0,0 +1,193 @@
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import select, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import Integer
+from models import Machine, CVAF, Intervention, RemoteService
+from services.status_codes import MACHINE_STATUS_URGENT, PSI_NOT_INSPECTED, LOW_SCORE_CODES
+
+# Bulk machine status: the rules of routers.machines.compute_machine_status applied to whole
+# arrays at once. verify_status_engine.py checks both agree on every combination of inputs.
+#
+#   critical     Excel status urgent, a pending HIGH intervention, or a low CVA SOS/inspection score
+#   maintenance  not inspected (PSI), flash update required, or a pending MEDIUM intervention
+#   operational  otherwise
+#
+# Besides the status, every machine gets a bit set of all the reasons that hold (not only the
+# one that decided), for audits.
+
+# Index = status code
+STATUS_NAMES = ("operational", "maintenance", "critical")
+STATUS_OPERATIONAL, STATUS_MAINTENANCE, STATUS_CRITICAL = range(3)
+
+REASON_URGENT_STATUS = 1
+REASON_HIGH_INTERVENTION = 2
+REASON_LOW_CVA_SCORE = 4
+REASON_NOT_INSPECTED = 8
+REASON_FLASH_UPDATE = 16
+REASON_MEDIUM_INTERVENTION = 32
+
+CRITICAL_REASONS = REASON_URGENT_STATUS | REASON_HIGH_INTERVENTION | REASON_LOW_CVA_SCORE
+MAINTENANCE_REASONS = REASON_NOT_INSPECTED | REASON_FLASH_UPDATE | REASON_MEDIUM_INTERVENTION
+
+REASON_LABELS = {
+    REASON_URGENT_STATUS: "Excel status urgent",
+    REASON_HIGH_INTERVENTION: "High priority intervention",
+    REASON_LOW_CVA_SCORE: "Low CVA score",
+    REASON_NOT_INSPECTED: "PSI: not inspected",
+    REASON_FLASH_UPDATE: "Remote Service: flash update required",
+    REASON_MEDIUM_INTERVENTION: "Medium priority intervention",
+}
+
+
+def evaluate(status_code, psi_code, cva_low, flash_update, pending_high, pending_medium) -> tuple:
+    """(int8 status codes, uint8 reason bits) from per-machine input arrays of equal length."""
+    reasons = np.where(np.asarray(status_code) == MACHINE_STATUS_URGENT, REASON_URGENT_STATUS, 0).astype(np.uint8)
+    reasons |= np.where(pending_high, REASON_HIGH_INTERVENTION, 0).astype(np.uint8)
+    reasons |= np.where(cva_low, REASON_LOW_CVA_SCORE, 0).astype(np.uint8)
+    reasons |= np.where(np.asarray(psi_code) == PSI_NOT_INSPECTED, REASON_NOT_INSPECTED, 0).astype(np.uint8)
+    reasons |= np.where(flash_update, REASON_FLASH_UPDATE, 0).astype(np.uint8)
+    reasons |= np.where(pending_medium, REASON_MEDIUM_INTERVENTION, 0).astype(np.uint8)
+    status = np.where(
+        reasons & CRITICAL_REASONS, STATUS_CRITICAL,
+        np.where(reasons & MAINTENANCE_REASONS, STATUS_MAINTENANCE, STATUS_OPERATIONAL),
+    ).astype(np.int8)
+    return status, reasons
+
+
+def reason_labels(reasons: int) -> List[str]:
+    return [label for bit, label in REASON_LABELS.items() if reasons & bit]
+
+
+class StatusInputs:
+    """Per-machine input arrays of the status rules, aligned with `ids` (ascending)."""
+
+    def __init__(self, ids, status_code, psi_code, cva_low, flash_update, pending_high, pending_medium):
+        self.ids = ids
+        self.status_code = status_code
+        self.psi_code = psi_code
+        self.cva_low = cva_low
+        self.flash_update = flash_update
+        self.pending_high = pending_high
+        self.pending_medium = pending_medium
+
+    @classmethod
+    def from_rows(cls, ids, status_codes, psi_codes, cvaf=(), flash_update_ids=(), pending=()) -> "StatusInputs":
+        """
+        ids ascending, with their status and PSI codes; cvaf: (machine_id, inspection_code, sos_code);
+        flash_update_ids: machines whose remote service has flash_update '1';
+        pending: (machine_id, priority) of PENDING interventions. Rows of unknown machines are ignored.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(ids)
+
+        def positions(machine_ids) -> np.ndarray:
+            machine_ids = np.asarray(machine_ids, dtype=np.int64)
+            pos = np.minimum(np.searchsorted(ids, machine_ids), max(n - 1, 0))
+            return pos[ids[pos] == machine_ids] if n else pos[:0]
+
+        cva_low = np.zeros(n, dtype=bool)
+        low = [machine_id for machine_id, inspection_code, sos_code in cvaf
+               if inspection_code in LOW_SCORE_CODES or sos_code in LOW_SCORE_CODES]
+        cva_low[positions(low)] = True
+        flash_update = np.zeros(n, dtype=bool)
+        flash_update[positions(list(flash_update_ids))] = True
+        pending_high = np.zeros(n, dtype=bool)
+        pending_high[positions([machine_id for machine_id, priority in pending if priority == "HIGH"])] = True
+        pending_medium = np.zeros(n, dtype=bool)
+        pending_medium[positions([machine_id for machine_id, priority in pending if priority == "MEDIUM"])] = True
+        return cls(
+            ids,
+            np.array([v or 0 for v in status_codes], dtype=np.int8),
+            np.array([v or 0 for v in psi_codes], dtype=np.int8),
+            cva_low, flash_update, pending_high, pending_medium,
+        )
+
+    @classmethod
+    def from_machines(cls, machines) -> "StatusInputs":
+        """From loaded Machine objects (interventions, cvaf and remote_service loaded), in their order."""
+        machines = list(machines)
+        return cls(
+            np.array([m.id for m in machines], dtype=np.int64),
+            np.array([m.status_code or 0 for m in machines], dtype=np.int8),
+            np.array([m.psi_code or 0 for m in machines], dtype=np.int8),
+            np.array([bool(m.cvaf) and (m.cvaf.sos_code in LOW_SCORE_CODES
+                                        or m.cvaf.inspection_code in LOW_SCORE_CODES) for m in machines], dtype=bool),
+            np.array([bool(m.remote_service) and m.remote_service.flash_update == '1' for m in machines], dtype=bool),
+            np.array([any(i.status == 'PENDING' and i.priority == 'HIGH' for i in m.interventions)
+                      for m in machines], dtype=bool),
+            np.array([any(i.status == 'PENDING' and i.priority == 'MEDIUM' for i in m.interventions)
+                      for m in machines], dtype=bool),
+        )
+
+    def evaluate(self) -> tuple:
+        return evaluate(self.status_code, self.psi_code, self.cva_low, self.flash_update,
+                        self.pending_high, self.pending_medium)
+
+
+def machine_statuses(machines) -> List[str]:
+    """Status names of loaded Machine objects, evaluated together."""
+    status, _ = StatusInputs.from_machines(machines).evaluate()
+    return [STATUS_NAMES[s] for s in status]
+
+
+class FleetStatuses:
+    """Status and reasons of every machine (ordered by id), from evaluate_fleet."""
+
+    def __init__(self, ids, serials: List[str], status, reasons):
+        self.ids = ids
+        self.serials = serials
+        self.status = status
+        self.reasons = reasons
+
+    def __len__(self):
+        return len(self.ids)
+
+    def counts(self) -> dict:
+        counts = np.bincount(self.status, minlength=len(STATUS_NAMES))
+        return {name: int(c) for name, c in zip(STATUS_NAMES, counts)}
+
+    def where(self, status: Optional[str] = None, reason: Optional[int] = None) -> np.ndarray:
+        """Positions of the machines with this status and/or this reason bit."""
+        mask = np.ones(len(self), dtype=bool)
+        if status is not None:
+            mask &= self.status == STATUS_NAMES.index(status)
+        if reason is not None:
+            mask &= (self.reasons & reason) != 0
+        return np.flatnonzero(mask)
+
+
+async def load_status_inputs(session: AsyncSession, machine_ids=None) -> tuple:
+    """(StatusInputs, serials) from four bulk queries, for all machines or the given ids."""
+    machines = select(Machine.id, Machine.serial_number, Machine.status_code, Machine.psi_code).order_by(Machine.id)
+    cvaf = select(Machine.id, CVAF.inspection_code, CVAF.sos_code).join(
+        CVAF, CVAF.serial_number == Machine.serial_number
+    )
+    flash = select(Machine.id).join(
+        RemoteService, RemoteService.serial_number == Machine.serial_number
+    ).where(RemoteService.flash_update == '1')
+    pending = select(Intervention.machine_id, Intervention.priority).where(
+        Intervention.status == 'PENDING', Intervention.priority.in_(['HIGH', 'MEDIUM'])
+    ).distinct()
+    if machine_ids is not None:
+        # One array parameter, whatever the number of ids
+        ids = bindparam("machine_ids", list(machine_ids), type_=ARRAY(Integer))
+        machines, cvaf, flash = (q.where(Machine.id == any_(ids)) for q in (machines, cvaf, flash))
+        pending = pending.where(Intervention.machine_id == any_(ids))
+
+    rows = (await session.execute(machines)).all()
+    inputs = StatusInputs.from_rows(
+        [r.id for r in rows], [r.status_code for r in rows], [r.psi_code for r in rows],
+        (await session.execute(cvaf)).all(),
+        (await session.execute(flash)).scalars().all(),
+        (await session.execute(pending)).all(),
+    )
+    return inputs, [r.serial_number for r in rows]
+
+
+async def evaluate_fleet(session: AsyncSession, machine_ids=None) -> FleetStatuses:
+    inputs, serials = await load_status_inputs(session, machine_ids)
+    status, reasons = inputs.evaluate()
+    return FleetStatuses(inputs.ids, serials, status, reasons)
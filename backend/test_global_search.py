@@ -1,6 +1,7 @@
 import asyncio
 import httpx
 import json
+from services.query_debug import assert_query_budget
 
 API_URL = "http://localhost:8000"
 
@@ -16,6 +17,7 @@ async def test_global_search():
         if response.status_code == 200:
             data = response.json()
             print(f"Found {len(data)} machines.")
+            assert_query_budget(response, 8, f"GET /machines/global-search?q={query}")
             if data:
                 print("Sample Machine Context:")
                 print(json.dumps(data[0], indent=2))
@@ -28,6 +30,7 @@ async def test_global_search():
         response = await client.get(f"{API_URL}/machines/global-search?q={query}")
         if response.status_code == 200:
              print(f"Found {len(response.json())} machines.")
+             assert_query_budget(response, 8, f"GET /machines/global-search?q={query}")
 
 if __name__ == "__main__":
     asyncio.run(test_global_search())
@@ -1,6 +1,7 @@
 
 import asyncio
 import httpx
+from services.query_debug import assert_query_budget
 
 API_URL = "http://localhost:8000"
 
@@ -16,6 +17,8 @@ async def test_interventions():
             return
 
         generate_data = response.json()
+        # A fixed number of rule queries; the bulk insert adds one statement per 1000 interventions
+        assert_query_budget(response, 40, "POST /interventions/generate")
         count = generate_data.get("count", 0)
         print(f"Generated {count} interventions.")
 
@@ -25,6 +28,7 @@ async def test_interventions():
         print(f"Fetch Response: {response.status_code}")
         
         interventions = response.json()
+        assert_query_budget(response, 4, "GET /interventions/")
         print(f"Fetched {len(interventions)} interventions.")
         
         # 3. Analyze Types & Priorities
@@ -1,6 +1,7 @@
 
 import asyncio
 import httpx
+from services.query_debug import assert_query_budget
 
 API_URL = "http://localhost:8000"
 
@@ -16,6 +17,8 @@ async def test_machines():
 
         machines = response.json()
         print(f"Fetched {len(machines)} machines.")
+        # Machines, their eager-loaded relations and the cache version check: no per-machine queries
+        assert_query_budget(response, 8, "GET /machines/?limit=5")
         
         if machines:
             print("Example Machine:", machines[0])
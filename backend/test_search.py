@@ -1,6 +1,7 @@
 
 import asyncio
 import httpx
+from services.query_debug import assert_query_budget
 
 API_URL = "http://localhost:8000"
 
@@ -23,6 +24,7 @@ async def test_search():
         
         if search_resp.status_code == 200:
             results = search_resp.json()
+            assert_query_budget(search_resp, 8, "GET /machines/?search=")
             print(f"Found {len(results)} machines matching '{partial_serial}'")
             matched = any(m['serialNumber'] == serial for m in results)
             print(f"Original machine found in results: {matched}")
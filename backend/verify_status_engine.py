@@ -0,0 +1,143 @@
+
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+from types import SimpleNamespace
+
+from routers.machines import compute_machine_status
+from services.status_codes import (
+    MACHINE_STATUS_OK, MACHINE_STATUS_URGENT, PSI_UNKNOWN, PSI_INSPECTED, PSI_NOT_INSPECTED,
+    SCORE_UNKNOWN, SCORE_OK, SCORE_LOW, SCORE_MISSING,
+)
+from services.status_engine import STATUS_NAMES, StatusInputs, reason_labels
+
+# Property check: the bulk status engine (services/status_engine.py) must give the same status
+# as the per-machine routers.machines.compute_machine_status, for every machine.
+#
+#   python verify_status_engine.py                  every combination of inputs, then random fleets
+#   python verify_status_engine.py --database       also the whole fleet of DATABASE_URL
+#
+# Both engine entry points are checked: StatusInputs.from_machines (loaded objects, used by
+# global search) and StatusInputs.from_rows (bulk query rows, used by the fleet snapshot and
+# evaluate_fleet). Exit code 1 on the first mismatches.
+
+STATUS_CODES = [MACHINE_STATUS_OK, MACHINE_STATUS_URGENT, None]
+PSI_CODES = [PSI_UNKNOWN, PSI_INSPECTED, PSI_NOT_INSPECTED, None]
+SCORE_CODES = [SCORE_UNKNOWN, SCORE_OK, SCORE_LOW, SCORE_MISSING, None]
+FLASH_VALUES = ['0', '1', None, '']
+PRIORITIES = ['HIGH', 'MEDIUM', 'LOW']
+STATUSES = ['PENDING', 'COMPLETED', 'CANCELLED']
+
+
+def fake_machine(machine_id, status_code, psi, cvaf_codes, flash, interventions):
+    """Machine-like object with the relationships compute_machine_status walks."""
+    return SimpleNamespace(
+        id=machine_id,
+        serial_number=f"PROP{machine_id:07d}",
+        status_code=status_code,
+        psi_code=psi,
+        cvaf=SimpleNamespace(inspection_code=cvaf_codes[0], sos_code=cvaf_codes[1]) if cvaf_codes else None,
+        remote_service=SimpleNamespace(flash_update=flash) if flash != "absent" else None,
+        interventions=[SimpleNamespace(priority=p, status=s) for p, s in interventions],
+    )
+
+
+def exhaustive_machines():
+    """Every combination of the inputs, with 0-2 interventions of any priority and status."""
+    intervention_sets = [()] + [((p, s),) for p in PRIORITIES for s in STATUSES] + [
+        (("HIGH", "COMPLETED"), ("MEDIUM", "PENDING")),
+        (("LOW", "PENDING"), ("HIGH", "PENDING")),
+    ]
+    cvafs = [None] + list(itertools.product(SCORE_CODES, SCORE_CODES))
+    combos = itertools.product(STATUS_CODES, PSI_CODES, cvafs, FLASH_VALUES + ["absent"], intervention_sets)
+    return [fake_machine(i + 1, *combo) for i, combo in enumerate(combos)]
+
+
+def random_machines(rng, n):
+    machines = []
+    for i in range(n):
+        interventions = [(rng.choice(PRIORITIES), rng.choice(STATUSES)) for _ in range(rng.randint(0, 4))]
+        cvaf = (rng.choice(SCORE_CODES), rng.choice(SCORE_CODES)) if rng.random() < 0.6 else None
+        flash = rng.choice(FLASH_VALUES + ["absent"])
+        machines.append(fake_machine(i + 1, rng.choice(STATUS_CODES), rng.choice(PSI_CODES), cvaf, flash, interventions))
+    return machines
+
+
+def inputs_from_rows(machines) -> StatusInputs:
+    """The bulk-query path: the same machines as (id, ...) rows, unordered, duplicates included."""
+    cvaf = [(m.id, m.cvaf.inspection_code, m.cvaf.sos_code) for m in machines if m.cvaf]
+    flash = [m.id for m in machines if m.remote_service and m.remote_service.flash_update == '1']
+    pending = [(m.id, i.priority) for m in machines for i in m.interventions if i.status == 'PENDING']
+    random.Random(0).shuffle(pending)
+    return StatusInputs.from_rows(
+        [m.id for m in machines], [m.status_code for m in machines], [m.psi_code for m in machines],
+        cvaf, flash, pending,
+    )
+
+
+def check(label: str, machines, show: int) -> bool:
+    expected = [compute_machine_status(m) for m in machines]
+    ok = True
+    for path, inputs in (("from_machines", StatusInputs.from_machines(machines)),
+                         ("from_rows", inputs_from_rows(machines))):
+        status, reasons = inputs.evaluate()
+        got = [STATUS_NAMES[s] for s in status]
+        mismatches = [i for i, (e, g) in enumerate(zip(expected, got)) if e != g]
+        print(f"{label} [{path}]: {len(machines)} machines, {len(mismatches)} mismatches")
+        for i in mismatches[:show]:
+            print(f"  {machines[i]}\n    expected {expected[i]}, engine {got[i]} ({', '.join(reason_labels(reasons[i]))})")
+        ok = ok and not mismatches
+    return ok
+
+
+async def check_database(show: int) -> bool:
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from database import AsyncSessionLocal
+    from models import Machine
+    from services.status_engine import evaluate_fleet
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Machine).options(
+                selectinload(Machine.interventions), selectinload(Machine.cvaf), selectinload(Machine.remote_service)
+            ).order_by(Machine.id)
+        )
+        machines = result.scalars().all()
+        fleet = await evaluate_fleet(session)
+
+    ok = check("database", machines, show)
+    # And evaluate_fleet's own queries
+    expected = {m.id: compute_machine_status(m) for m in machines}
+    mismatches = [(int(i), expected.get(int(i)), STATUS_NAMES[s]) for i, s in zip(fleet.ids, fleet.status)
+                  if expected.get(int(i)) != STATUS_NAMES[s]]
+    print(f"database [evaluate_fleet]: {len(fleet)} machines, {len(mismatches)} mismatches")
+    for machine_id, e, g in mismatches[:show]:
+        print(f"  machine {machine_id}: expected {e}, engine {g}")
+    return ok and not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the bulk status engine against compute_machine_status")
+    parser.add_argument("--fleets", type=int, default=20, help="random fleets to check")
+    parser.add_argument("--size", type=int, default=5000, help="machines per random fleet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", action="store_true", help="also check every machine of DATABASE_URL")
+    parser.add_argument("--show", type=int, default=5, help="mismatches printed per check")
+    args = parser.parse_args()
+
+    ok = check("exhaustive", exhaustive_machines(), args.show)
+    rng = random.Random(args.seed)
+    for k in range(args.fleets):
+        ok = check(f"random fleet {k}", random_machines(rng, args.size), args.show) and ok
+    if args.database:
+        ok = asyncio.run(check_database(args.show)) and ok
+
+    print("\nOK: engine matches compute_machine_status" if ok else "\nFAIL: engine and compute_machine_status disagree")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()